@@ -5,6 +5,7 @@ from .jwt_dep import (
     AuthContext,
     TokenPayload,
     get_auth_context,
+    require_access,
     require_roles,
     require_scopes,
     require_tenant_access,
@@ -23,7 +24,8 @@ from .rbac import (
     Permission, Role, AccessContext, 
     require_permission, require_any_permission, 
     require_resource_access, require_role,
-    audit_log, create_access_context
+    audit_log, create_access_context,
+    invalidate_role, set_role_permissions
 )
 
 from .middleware import (
@@ -37,6 +39,7 @@ __all__ = [
     "AuthContext",
     "TokenPayload",
     "get_auth_context",
+    "require_access",
     "require_roles",
     "require_scopes",
     "require_tenant_access",
@@ -53,6 +56,7 @@ __all__ = [
     "require_permission", "require_any_permission", 
     "require_resource_access", "require_role",
     "audit_log", "create_access_context",
+    "invalidate_role", "set_role_permissions",
     "RateLimitMiddleware", "SecurityHeadersMiddleware",
     "RequestValidationMiddleware", "IPFilterMiddleware",
     "RequestLoggingMiddleware", "CORSSecurityMiddleware"
@@ -1,21 +1,39 @@
+from contextlib import asynccontextmanager
 
+import structlog
 from fastapi import FastAPI
-from .jwt_dep import verify_bearer
+
+from .jwt_dep import _jwks_cache
+
+logger = structlog.get_logger(__name__)
+
 
 class AuthN:
     def __init__(self, app: FastAPI, jwks_url: str, audience: str, issuer: str):
-        # This is a placeholder for a more comprehensive AuthN setup.
-        # In a real scenario, this would configure JWT validation middleware,
-        # potentially caching JWKS, and setting up security schemes.
-        # For now, we'll just ensure the parameters are received.
+        # Token verification itself is done per route via verify_bearer_token;
+        # this hooks the app lifecycle so the JWKS keys are loaded before the
+        # server starts accepting traffic.
         self.app = app
         self.jwks_url = jwks_url
         self.audience = audience
         self.issuer = issuer
-        
-        # You might add a dependency here that applies to all routes
-        # or specific routers. For simplicity, we're not adding a global
-        # dependency here as verify_bearer is used as a route dependency.
-        # app.dependency_overrides[verify_bearer] = lambda: None # Example
 
+        # Wrap the existing lifespan so this also works for apps created with
+        # lifespan=..., where startup event handlers are not run
+        app_lifespan = app.router.lifespan_context
+
+        @asynccontextmanager
+        async def lifespan(app: FastAPI):
+            await self.warmup()
+            async with app_lifespan(app) as state:
+                yield state
+
+        app.router.lifespan_context = lifespan
 
+    async def warmup(self):
+        """Fetch and parse the JWKS keys so the first request does not pay for it."""
+        try:
+            await _jwks_cache.refresh()
+        except Exception as e:
+            # Keys will be fetched lazily on the first authenticated request
+            logger.warning("JWKS warmup failed", error=str(e), jwks_url=self.jwks_url)
@@ -1,13 +1,20 @@
 """JWT authentication dependency for FastAPI services."""
 
+import asyncio
+import hashlib
 import os
-from functools import lru_cache
-from typing import Annotated, Any, Dict, List, Optional
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Annotated, Any, Dict, FrozenSet, Iterable, List, Optional
 
 import httpx
+import jwt
 import structlog
+from cachetools import TLRUCache
 from fastapi import Depends, HTTPException, Header, status
-from jose import jwt, JWTError
+from fastapi.concurrency import run_in_threadpool
+from jwt import PyJWK, PyJWKError, PyJWTError
 from pydantic import BaseModel
 
 logger = structlog.get_logger(__name__)
@@ -16,6 +23,10 @@ logger = structlog.get_logger(__name__)
 ISSUER = os.getenv("OIDC_ISSUER", "")
 AUDIENCE = os.getenv("OIDC_AUDIENCE", "")
 JWKS_URL = os.getenv("JWKS_URL", "")
+JWKS_CACHE_TTL = int(os.getenv("JWKS_CACHE_TTL", "600"))
+JWKS_MIN_REFRESH_INTERVAL = int(os.getenv("JWKS_MIN_REFRESH_INTERVAL", "30"))
+TOKEN_CACHE_TTL = int(os.getenv("JWT_CACHE_TTL", "30"))
+TOKEN_CACHE_MAXSIZE = int(os.getenv("JWT_CACHE_MAXSIZE", "10000"))
 
 
 class TokenPayload(BaseModel):
@@ -35,56 +46,134 @@ class TokenPayload(BaseModel):
     scope: Optional[str] = None
 
 
-class AuthContext(BaseModel):
-    """Authentication context for the current request."""
+@dataclass(slots=True)
+class AuthContext:
+    """Authentication context for the current request.
+    
+    Built on every authenticated request from an already-verified token, so it
+    is a plain dataclass rather than a validating Pydantic model.
+    """
     
     user_id: str
     username: str
     email: Optional[str] = None
-    roles: List[str] = []
+    roles: List[str] = field(default_factory=list)
     tenant_id: Optional[str] = None
-    scopes: List[str] = []
+    scopes: List[str] = field(default_factory=list)
+    
+    _role_set: FrozenSet[str] = field(init=False, repr=False, compare=False)
+    _scope_set: FrozenSet[str] = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        """Index roles and scopes for constant-time membership checks."""
+        self._role_set = frozenset(self.roles)
+        self._scope_set = frozenset(self.scopes)
     
     def has_role(self, role: str) -> bool:
         """Check if user has a specific role."""
-        return role in self.roles
+        return role in self._role_set
     
-    def has_any_role(self, roles: List[str]) -> bool:
+    def has_any_role(self, roles: Iterable[str]) -> bool:
         """Check if user has any of the specified roles."""
-        return any(role in self.roles for role in roles)
+        return not self._role_set.isdisjoint(roles)
     
     def has_scope(self, scope: str) -> bool:
         """Check if user has a specific scope."""
-        return scope in self.scopes
+        return scope in self._scope_set
+    
+    def has_any_scope(self, scopes: Iterable[str]) -> bool:
+        """Check if user has any of the specified scopes."""
+        return not self._scope_set.isdisjoint(scopes)
 
 
-@lru_cache(maxsize=1)
-def _get_jwks() -> Dict[str, Any]:
-    """Fetch and cache JWKS from the identity provider."""
-    if not JWKS_URL:
-        raise ValueError("JWKS_URL environment variable is required")
+class _JwksCache:
+    """JWKS keys indexed by key ID, refreshed periodically.
     
-    try:
-        with httpx.Client(timeout=10) as client:
-            response = client.get(JWKS_URL)
-            response.raise_for_status()
-            return response.json()
-    except Exception as e:
-        logger.error("Failed to fetch JWKS", error=str(e), jwks_url=JWKS_URL)
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Unable to verify tokens - authentication service unavailable"
-        )
+    Keys are parsed into PyJWK objects once per fetch so that token verification
+    does not rebuild the public key from the JWK on every request.
+    
+    Refreshes are single-flight: concurrent callers share one fetch, and callers
+    that already hold usable keys keep serving them while a refresh is running.
+    If a refresh fails, the previous keys are served until the next attempt.
+    """
+    
+    def __init__(self, ttl: float, min_refresh_interval: float):
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.by_kid: Dict[str, PyJWK] = {}
+        self.expires_at = 0.0
+        self.fetched_at = 0.0
+        self.refresh_lock = asyncio.Lock()
+    
+    async def get_key(self, kid: str) -> Optional[PyJWK]:
+        """Get the key for a key ID, refreshing once if it is unknown."""
+        if time.monotonic() >= self.expires_at:
+            await self.refresh()
+        
+        key = self.by_kid.get(kid)
+        if key is None and time.monotonic() - self.fetched_at >= self.min_refresh_interval:
+            # The IdP may have rotated keys since the last fetch
+            await self.refresh(force=True)
+            key = self.by_kid.get(kid)
+        return key
+    
+    async def refresh(self, force: bool = False):
+        """Fetch the JWKS document and rebuild the key index."""
+        if self.by_kid and not force and self.refresh_lock.locked():
+            return
+        
+        requested_at = time.monotonic()
+        async with self.refresh_lock:
+            # Another request refreshed the keys while we waited
+            if self.fetched_at >= requested_at or (not force and requested_at < self.expires_at):
+                return
+            
+            if not JWKS_URL:
+                raise ValueError("JWKS_URL environment variable is required")
+            
+            try:
+                async with httpx.AsyncClient(timeout=10) as client:
+                    response = await client.get(JWKS_URL)
+                    response.raise_for_status()
+                    jwks = response.json()
+            except Exception as e:
+                if self.by_kid:
+                    logger.warning("Failed to refresh JWKS, serving cached keys", error=str(e), jwks_url=JWKS_URL)
+                    self.expires_at = time.monotonic() + self.min_refresh_interval
+                    return
+                logger.error("Failed to fetch JWKS", error=str(e), jwks_url=JWKS_URL)
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Unable to verify tokens - authentication service unavailable"
+                )
+            
+            self.by_kid = _parse_jwks(jwks)
+            self.fetched_at = time.monotonic()
+            self.expires_at = self.fetched_at + self.ttl
+
+
+def _parse_jwks(jwks: Dict[str, Any]) -> Dict[str, PyJWK]:
+    """Parse a JWKS document into signing keys indexed by key ID."""
+    by_kid = {}
+    for key in jwks.get("keys", []):
+        kid = key.get("kid")
+        if not kid:
+            continue
+        try:
+            by_kid[kid] = PyJWK(key)
+        except PyJWKError as e:
+            logger.warning("Skipping unusable JWKS key", kid=kid, error=str(e))
+    return by_kid
 
 
-def _get_signing_key(kid: str) -> Dict[str, Any]:
+_jwks_cache = _JwksCache(ttl=JWKS_CACHE_TTL, min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL)
+
+
+async def _get_signing_key(kid: str) -> PyJWK:
     """Get the signing key for the given key ID."""
-    jwks = _get_jwks()
-    keys = jwks.get("keys", [])
-    
-    for key in keys:
-        if key.get("kid") == kid:
-            return key
+    key = await _jwks_cache.get_key(kid)
+    if key is not None:
+        return key
     
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -92,7 +181,73 @@ def _get_signing_key(kid: str) -> Dict[str, Any]:
     )
 
 
-def verify_bearer_token(
+def _token_ttu(key: str, payload: TokenPayload, now: float) -> float:
+    """Expire cached payloads after the configured TTL or at token expiry, whichever is first."""
+    return min(now + TOKEN_CACHE_TTL, payload.exp)
+
+
+# Verified payloads keyed by token hash; only successful verifications are cached
+_token_cache: TLRUCache = TLRUCache(
+    maxsize=TOKEN_CACHE_MAXSIZE, ttu=_token_ttu, timer=time.time
+)
+_token_cache_lock = threading.Lock()
+
+
+def _token_cache_key(token: str) -> str:
+    """Build the cache key for a raw bearer token."""
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def _get_cached_payload(token: str) -> Optional[TokenPayload]:
+    """Return the cached payload for a previously verified token, if any."""
+    with _token_cache_lock:
+        return _token_cache.get(_token_cache_key(token))
+
+
+def _decode_sync(token: str, signing_key: PyJWK) -> TokenPayload:
+    """Verify the token signature and claims, caching the parsed payload.
+    
+    This is CPU-bound and is run in the threadpool by verify_bearer_token.
+    """
+    payload = jwt.decode(
+        token,
+        signing_key.key,
+        algorithms=[signing_key.algorithm_name],
+        audience=AUDIENCE,
+        issuer=ISSUER,
+        options={"verify_signature": True, "verify_exp": True}
+    )
+    
+    token_payload = TokenPayload(**payload)
+    with _token_cache_lock:
+        _token_cache[_token_cache_key(token)] = token_payload
+    return token_payload
+
+
+async def _verify_and_cache(token: str) -> TokenPayload:
+    """Verify a token, reusing a cached payload for tokens seen recently."""
+    cached = _get_cached_payload(token)
+    if cached is not None:
+        return cached
+    
+    # Get the unverified header to extract the key ID
+    unverified_header = jwt.get_unverified_header(token)
+    kid = unverified_header.get("kid")
+    
+    if not kid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token - missing key ID"
+        )
+    
+    # Get the signing key
+    signing_key = await _get_signing_key(kid)
+    
+    # Verify and decode the token off the event loop
+    return await run_in_threadpool(_decode_sync, token, signing_key)
+
+
+async def verify_bearer_token(
     authorization: Annotated[Optional[str], Header()] = None
 ) -> TokenPayload:
     """Verify and decode JWT bearer token."""
@@ -103,48 +258,27 @@ def verify_bearer_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    if not authorization.lower().startswith("bearer "):
+    if len(authorization) < 7 or authorization[:7].lower() != "bearer ":
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authorization header format",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    token = authorization.split(" ", 1)[1]
+    token = authorization[7:]
     
     try:
-        # Get the unverified header to extract the key ID
-        unverified_header = jwt.get_unverified_header(token)
-        kid = unverified_header.get("kid")
-        
-        if not kid:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token - missing key ID"
-            )
-        
-        # Get the signing key
-        signing_key = _get_signing_key(kid)
-        
-        # Verify and decode the token
-        payload = jwt.decode(
-            token,
-            signing_key,
-            algorithms=[signing_key.get("alg", "RS256")],
-            audience=AUDIENCE,
-            issuer=ISSUER,
-            options={"verify_signature": True, "verify_exp": True}
-        )
+        return await _verify_and_cache(token)
         
-        return TokenPayload(**payload)
-        
-    except JWTError as e:
+    except PyJWTError as e:
         logger.warning("JWT verification failed", error=str(e))
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Invalid token: {str(e)}",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Unexpected error during token verification", error=str(e))
         raise HTTPException(
@@ -153,7 +287,7 @@ def verify_bearer_token(
         )
 
 
-from py_hrms_tenancy import set_tenant_context
+from py_hrms_tenancy import get_current_tenant, set_tenant_context
 
 def get_auth_context(token: TokenPayload = Depends(verify_bearer_token)) -> AuthContext:
     """Extract authentication context from verified token."""
@@ -170,36 +304,58 @@ def get_auth_context(token: TokenPayload = Depends(verify_bearer_token)) -> Auth
         scopes=scopes
     )
 
-    if auth_context.tenant_id:
+    # Tenant middleware usually sets this already; avoid a redundant ContextVar.set
+    if auth_context.tenant_id and get_current_tenant() != auth_context.tenant_id:
         set_tenant_context(auth_context.tenant_id)
 
     return auth_context
 
 
-def require_roles(required_roles: List[str]):
-    """Dependency factory to require specific roles."""
-    def _check_roles(auth: AuthContext = Depends(get_auth_context)) -> AuthContext:
-        if not auth.has_any_role(required_roles):
+def require_access(
+    roles: Iterable[str] = (),
+    scopes: Iterable[str] = (),
+    tenant: bool = False,
+):
+    """Dependency factory checking roles, scopes and tenant access in one step.
+    
+    Any of the given roles and any of the given scopes is sufficient. Combining
+    the checks keeps a single dependency between the endpoint and
+    get_auth_context instead of one per requirement.
+    """
+    required_roles = list(roles)
+    required_scopes = list(scopes)
+    role_set = frozenset(required_roles)
+    scope_set = frozenset(required_scopes)
+    
+    def _check_access(auth: AuthContext = Depends(get_auth_context)) -> AuthContext:
+        if role_set and not auth.has_any_role(role_set):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Insufficient permissions. Required roles: {required_roles}"
             )
-        return auth
-    
-    return _check_roles
-
-
-def require_scopes(required_scopes: List[str]):
-    """Dependency factory to require specific scopes."""
-    def _check_scopes(auth: AuthContext = Depends(get_auth_context)) -> AuthContext:
-        if not any(auth.has_scope(scope) for scope in required_scopes):
+        if scope_set and not auth.has_any_scope(scope_set):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Insufficient permissions. Required scopes: {required_scopes}"
             )
+        if tenant and not auth.tenant_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Tenant access required"
+            )
         return auth
     
-    return _check_scopes
+    return _check_access
+
+
+def require_roles(required_roles: List[str]):
+    """Dependency factory to require specific roles."""
+    return require_access(roles=required_roles)
+
+
+def require_scopes(required_scopes: List[str]):
+    """Dependency factory to require specific scopes."""
+    return require_access(scopes=required_scopes)
 
 
 def require_tenant_access(auth: AuthContext = Depends(get_auth_context)) -> AuthContext:
@@ -213,13 +369,13 @@ def require_tenant_access(auth: AuthContext = Depends(get_auth_context)) -> Auth
 
 
 # Common role-based dependencies
-RequireHRAdmin = Depends(require_roles(["hr.admin"]))
-RequireHRManager = Depends(require_roles(["hr.manager", "hr.admin"]))
-RequireEmployeeAdmin = Depends(require_roles(["employee.admin", "hr.admin"]))
-RequireEmployeeManager = Depends(require_roles(["employee.manager", "employee.admin", "hr.admin"]))
-RequireEmployeeSelf = Depends(require_roles(["employee.self", "employee.manager", "employee.admin", "hr.admin"]))
+RequireHRAdmin = Depends(require_access(roles=["hr.admin"]))
+RequireHRManager = Depends(require_access(roles=["hr.manager", "hr.admin"]))
+RequireEmployeeAdmin = Depends(require_access(roles=["employee.admin", "hr.admin"]))
+RequireEmployeeManager = Depends(require_access(roles=["employee.manager", "employee.admin", "hr.admin"]))
+RequireEmployeeSelf = Depends(require_access(roles=["employee.self", "employee.manager", "employee.admin", "hr.admin"]))
 
 # Agent role dependencies
-RequireAgentLeaveRequester = Depends(require_roles(["agent.leave.requester"]))
-RequireAgentTimesheetApprover = Depends(require_roles(["agent.timesheet.approver"]))
-RequireAgentPayrollProcessor = Depends(require_roles(["agent.payroll.processor"]))
+RequireAgentLeaveRequester = Depends(require_access(roles=["agent.leave.requester"]))
+RequireAgentTimesheetApprover = Depends(require_access(roles=["agent.timesheet.approver"]))
+RequireAgentPayrollProcessor = Depends(require_access(roles=["agent.payroll.processor"]))
@@ -1,34 +1,79 @@
 """
 Security middleware for AgenticHR services
 
-This module provides security middleware including:
+This module provides security middleware, implemented as pure ASGI
+middleware, including:
 - Rate limiting
 - Request validation
 - Security headers
 - IP filtering
 - Request logging
 """
+import re
 import time
 import json
 import hashlib
-from typing import Dict, Any, Optional, List
-from fastapi import Request, Response, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
+import ipaddress
+from typing import Dict, Any, Optional, List, Tuple
+from cachetools import TTLCache
+from fastapi import Request, HTTPException
+from starlette.datastructures import MutableHeaders
 from starlette.responses import JSONResponse
-import logging
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+import structlog
 
-# Configure security logger
-security_logger = logging.getLogger("agentichr.security")
-security_logger.setLevel(logging.INFO)
+from .rbac import request_audit_meta_var
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    """Rate limiting middleware using in-memory storage"""
+# Security logger; output format and level follow the service's structlog config
+security_logger = structlog.get_logger("agentichr.security")
+
+def _has_sha_extensions() -> bool:
+    """Check whether the CPU has SHA-256 instructions (x86 SHA-NI / ARMv8 SHA2)"""
+    try:
+        with open("/proc/cpuinfo") as cpuinfo:
+            flags = set()
+            for line in cpuinfo:
+                if line.startswith(("flags", "Features")):
+                    flags.update(line.split(":", 1)[1].split())
+                    break
+    except OSError:
+        return False
+    return "sha_ni" in flags or "sha2" in flags
+
+def _hash_blake2b(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+def _hash_sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:16]
+
+# OpenSSL's SHA-256 uses the CPU's SHA instructions when present and then beats
+# BLAKE2b on short inputs; without them BLAKE2b is the faster choice
+_client_key_hash = _hash_sha256 if _has_sha_extensions() else _hash_blake2b
+
+class RateLimitMiddleware:
+    """Rate limiting middleware
     
-    def __init__(self, app, calls: int = 100, period: int = 60):
-        super().__init__(app)
+    Uses an in-memory token bucket per process by default. When a
+    ``redis.asyncio.Redis`` client is given, counts are kept in Redis as
+    fixed windows so the limit is shared across workers and pods.
+    """
+    
+    def __init__(
+        self,
+        app,
+        calls: int = 100,
+        period: int = 60,
+        max_clients: int = 100_000,
+        redis_client: Optional[Any] = None,
+    ):
+        self.app = app
         self.calls = calls
         self.period = period
-        self.clients: Dict[str, Dict[str, Any]] = {}
+        self.redis_client = redis_client
+        self.refill_rate = calls / period
+        # (tokens, last_refill) per client; idle clients are evicted once their
+        # bucket would have refilled, and the LRU bound caps memory under scans
+        self.clients: TTLCache = TTLCache(maxsize=max_clients, ttl=period * 2)
     
     def _get_client_key(self, request: Request) -> str:
         """Get client identifier for rate limiting"""
@@ -39,64 +84,91 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
         auth_header = request.headers.get("authorization")
         if auth_header:
             # Simple hash of auth header for consistent key
-            auth_hash = hashlib.md5(auth_header.encode()).hexdigest()[:8]
+            auth_hash = _client_key_hash(auth_header.encode())
             return f"user_{auth_hash}"
         
         return f"ip_{client_ip}"
     
     def _is_rate_limited(self, client_key: str) -> bool:
-        """Check if client is rate limited"""
-        now = time.time()
+        """Check if client is rate limited
         
-        if client_key not in self.clients:
-            self.clients[client_key] = {
-                "calls": 1,
-                "window_start": now
-            }
-            return False
-        
-        client_data = self.clients[client_key]
+        Runs without awaiting, so the read-modify-write of a bucket is atomic
+        with respect to other requests on the event loop.
+        """
+        now = time.monotonic()
         
-        # Reset window if period has passed
-        if now - client_data["window_start"] > self.period:
-            client_data["calls"] = 1
-            client_data["window_start"] = now
+        bucket = self.clients.get(client_key)
+        if bucket is None:
+            self.clients[client_key] = (self.calls - 1, now)
             return False
         
-        # Check if limit exceeded
-        if client_data["calls"] >= self.calls:
+        # Refill tokens for the time elapsed since the last request
+        tokens, last_refill = bucket
+        tokens = min(self.calls, tokens + (now - last_refill) * self.refill_rate)
+        
+        if tokens < 1:
+            self.clients[client_key] = (tokens, now)
             return True
         
-        # Increment call count
-        client_data["calls"] += 1
+        self.clients[client_key] = (tokens - 1, now)
         return False
     
-    async def dispatch(self, request: Request, call_next):
+    async def _is_rate_limited_shared(self, client_key: str) -> bool:
+        """Check if client is rate limited using the shared Redis counter"""
+        window = int(time.time() // self.period)
+        key = f"rl:{window}:{client_key}"
+        
+        try:
+            pipe = self.redis_client.pipeline()
+            pipe.incr(key)
+            pipe.expire(key, self.period, nx=True)
+            count, _ = await pipe.execute()
+        except Exception as e:
+            # Fail open rather than rejecting traffic when Redis is unavailable
+            security_logger.error(
+                "rate_limit_storage_unavailable",
+                client_key=client_key,
+                error=str(e)
+            )
+            return False
+        
+        return count > self.calls
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        request = Request(scope)
         client_key = self._get_client_key(request)
         
-        if self._is_rate_limited(client_key):
+        if self.redis_client is not None:
+            rate_limited = await self._is_rate_limited_shared(client_key)
+        else:
+            rate_limited = self._is_rate_limited(client_key)
+        
+        if rate_limited:
             security_logger.warning(
-                f"Rate limit exceeded for client {client_key}",
-                extra={
-                    "client_key": client_key,
-                    "ip": request.client.host if request.client else None,
-                    "path": request.url.path,
-                    "method": request.method
-                }
+                "rate_limit_exceeded",
+                client_key=client_key,
+                ip=request.client.host if request.client else None,
+                path=request.url.path,
+                method=request.method
             )
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=429,
                 content={"error": "Rate limit exceeded", "retry_after": self.period}
             )
+            await response(scope, receive, send)
+            return
         
-        response = await call_next(request)
-        return response
+        await self.app(scope, receive, send)
 
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
+class SecurityHeadersMiddleware:
     """Add security headers to responses"""
     
-    def __init__(self, app):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp):
+        self.app = app
         self.security_headers = {
             "X-Content-Type-Options": "nosniff",
             "X-Frame-Options": "DENY",
@@ -105,21 +177,54 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
             "Referrer-Policy": "strict-origin-when-cross-origin",
             "Content-Security-Policy": "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline'",
         }
+        # Encode once so each response only needs a list extend
+        self._raw_headers = [
+            (header.lower().encode("latin-1"), value.encode("latin-1"))
+            for header, value in self.security_headers.items()
+        ]
+        self._raw_header_names = frozenset(name for name, _ in self._raw_headers)
     
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        # Add security headers
-        for header, value in self.security_headers.items():
-            response.headers[header] = value
+        async def send_with_headers(message: Message):
+            if message["type"] == "http.response.start":
+                # Add security headers, keeping any the endpoint already set
+                raw_headers = list(message.get("headers", []))
+                if self._raw_header_names.isdisjoint(name for name, _ in raw_headers):
+                    raw_headers.extend(self._raw_headers)
+                else:
+                    existing = {name for name, _ in raw_headers}
+                    raw_headers.extend(
+                        header for header in self._raw_headers if header[0] not in existing
+                    )
+                message["headers"] = raw_headers
+            await send(message)
         
-        return response
+        await self.app(scope, receive, send_with_headers)
 
-class RequestValidationMiddleware(BaseHTTPMiddleware):
+class RequestValidationMiddleware:
     """Validate incoming requests"""
     
-    def __init__(self, app, max_content_length: int = 10 * 1024 * 1024):  # 10MB
-        super().__init__(app)
+    # Common attack patterns checked against the request URL
+    suspicious_patterns = [
+        "../",
+        "..\\",
+        "<script",
+        "javascript:",
+        "vbscript:",
+        "onload=",
+        "onerror=",
+        "union select",
+        "drop table",
+        "insert into",
+        "delete from",
+    ]
+    
+    def __init__(self, app: ASGIApp, max_content_length: int = 10 * 1024 * 1024):  # 10MB
+        self.app = app
         self.max_content_length = max_content_length
         self.blocked_user_agents = [
             "sqlmap",
@@ -128,72 +233,108 @@ class RequestValidationMiddleware(BaseHTTPMiddleware):
             "masscan",
             "nessus",
         ]
+        
+        # Match all patterns in a single scan instead of one substring check each,
+        # directly against the raw bytes from the ASGI scope
+        self._user_agent_re = re.compile(
+            b"|".join(re.escape(agent.encode()) for agent in self.blocked_user_agents), re.IGNORECASE
+        )
+        self._url_re = re.compile(
+            b"|".join(re.escape(pattern.encode()) for pattern in self.suspicious_patterns), re.IGNORECASE
+        )
     
-    def _is_suspicious_request(self, request: Request) -> Optional[str]:
+    def _is_suspicious_request(self, scope: Scope) -> Optional[str]:
         """Check if request is suspicious"""
+        content_length = None
+        user_agent = b""
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                content_length = value
+            elif name == b"user-agent":
+                user_agent = value
         
         # Check content length
-        content_length = request.headers.get("content-length")
         if content_length and int(content_length) > self.max_content_length:
-            return f"Content length too large: {content_length}"
+            return f"Content length too large: {content_length.decode('latin-1')}"
         
         # Check user agent
-        user_agent = request.headers.get("user-agent", "").lower()
-        for blocked_agent in self.blocked_user_agents:
-            if blocked_agent in user_agent:
-                return f"Blocked user agent: {user_agent}"
-        
-        # Check for common attack patterns in URL
-        suspicious_patterns = [
-            "../",
-            "..\\",
-            "<script",
-            "javascript:",
-            "vbscript:",
-            "onload=",
-            "onerror=",
-            "union select",
-            "drop table",
-            "insert into",
-            "delete from",
-        ]
+        if self._user_agent_re.search(user_agent):
+            return f"Blocked user agent: {user_agent.decode('latin-1').lower()}"
         
-        url_path = str(request.url).lower()
-        for pattern in suspicious_patterns:
-            if pattern in url_path:
-                return f"Suspicious pattern in URL: {pattern}"
+        # Check for common attack patterns in the path and query string. The
+        # decoded path is used so percent-encoded traversal is still caught.
+        target = scope["path"].encode() + b"?" + scope["query_string"]
+        match = self._url_re.search(target)
+        if match:
+            return f"Suspicious pattern in URL: {match.group(0).decode('latin-1').lower()}"
         
         return None
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         # Validate request
-        suspicious_reason = self._is_suspicious_request(request)
+        suspicious_reason = self._is_suspicious_request(scope)
         if suspicious_reason:
+            request = Request(scope)
             security_logger.warning(
-                f"Suspicious request blocked: {suspicious_reason}",
-                extra={
-                    "ip": request.client.host if request.client else None,
-                    "path": request.url.path,
-                    "method": request.method,
-                    "user_agent": request.headers.get("user-agent"),
-                    "reason": suspicious_reason
-                }
+                "suspicious_request_blocked",
+                ip=request.client.host if request.client else None,
+                path=request.url.path,
+                method=request.method,
+                user_agent=request.headers.get("user-agent"),
+                reason=suspicious_reason
             )
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=400,
                 content={"error": "Invalid request"}
             )
+            await response(scope, receive, send)
+            return
         
-        response = await call_next(request)
-        return response
+        await self.app(scope, receive, send)
 
-class IPFilterMiddleware(BaseHTTPMiddleware):
-    """Filter requests by IP address"""
+class _NetworkSet:
+    """Set of IP networks supporting containment checks for single addresses
     
-    def __init__(self, app, allowed_ips: Optional[List[str]] = None, blocked_ips: Optional[List[str]] = None):
-        super().__init__(app)
-        self.allowed_ips = set(allowed_ips or [])
-        self.blocked_ips = set(blocked_ips or [])
+    Networks are stored as their masked prefix, grouped by address family and
+    prefix length, so a lookup costs one set probe per distinct prefix length
+    rather than one comparison per network.
+    """
+    
+    def __init__(self, networks: List[str]):
+        self._prefixes: Dict[Tuple[int, int], set] = {}
+        for entry in networks:
+            network = ipaddress.ip_network(entry, strict=False)
+            shift = network.max_prefixlen - network.prefixlen
+            self._prefixes.setdefault((network.version, shift), set()).add(
+                int(network.network_address) >> shift
+            )
+    
+    def __len__(self) -> int:
+        return sum(len(prefixes) for prefixes in self._prefixes.values())
+    
+    def __contains__(self, ip: str) -> bool:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        
+        value = int(address)
+        for (version, shift), prefixes in self._prefixes.items():
+            if version == address.version and value >> shift in prefixes:
+                return True
+        return False
+
+class IPFilterMiddleware:
+    """Filter requests by IP address or CIDR range"""
+    
+    def __init__(self, app: ASGIApp, allowed_ips: Optional[List[str]] = None, blocked_ips: Optional[List[str]] = None):
+        self.app = app
+        self.allowed_ips = _NetworkSet(allowed_ips or [])
+        self.blocked_ips = _NetworkSet(blocked_ips or [])
     
     def _is_ip_allowed(self, ip: str) -> bool:
         """Check if IP is allowed"""
@@ -204,35 +345,72 @@ class IPFilterMiddleware(BaseHTTPMiddleware):
         # If allowed IPs specified, only allow those
         return ip in self.allowed_ips and ip not in self.blocked_ips
     
-    async def dispatch(self, request: Request, call_next):
-        client_ip = request.client.host if request.client else "unknown"
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        client = scope.get("client")
+        client_ip = client[0] if client else "unknown"
         
         if not self._is_ip_allowed(client_ip):
             security_logger.warning(
-                f"IP blocked: {client_ip}",
-                extra={
-                    "ip": client_ip,
-                    "path": request.url.path,
-                    "method": request.method
-                }
+                "ip_blocked",
+                ip=client_ip,
+                path=scope["path"],
+                method=scope["method"]
             )
-            return JSONResponse(
+            response = JSONResponse(
                 status_code=403,
                 content={"error": "Access denied"}
             )
+            await response(scope, receive, send)
+            return
         
-        response = await call_next(request)
-        return response
+        await self.app(scope, receive, send)
 
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
+class RequestLoggingMiddleware:
     """Log all requests for security monitoring"""
     
-    def __init__(self, app, log_body: bool = False):
-        super().__init__(app)
+    # Maximum number of body bytes included in request logs
+    body_preview_limit = 1024
+    
+    def __init__(self, app: ASGIApp, log_body: bool = False):
+        self.app = app
         self.log_body = log_body
     
-    async def dispatch(self, request: Request, call_next):
+    async def _read_body_preview(self, receive: Receive) -> Tuple[bytes, Receive]:
+        """Read the start of the request body without consuming it
+        
+        Only as many ASGI messages as needed to fill the preview are read. The
+        returned receive callable replays them before the rest of the stream.
+        """
+        buffered = []
+        preview = b""
+        
+        while len(preview) < self.body_preview_limit:
+            message = await receive()
+            buffered.append(message)
+            if message["type"] != "http.request":
+                break
+            preview += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+        
+        async def replay_receive():
+            if buffered:
+                return buffered.pop(0)
+            return await receive()
+        
+        return preview[:self.body_preview_limit], replay_receive
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         start_time = time.time()
+        request = Request(scope)
         
         # Log request
         request_data = {
@@ -247,32 +425,46 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
         # Log request body if enabled (be careful with sensitive data)
         if self.log_body and request.method in ["POST", "PUT", "PATCH"]:
             try:
-                body = await request.body()
+                body, receive = await self._read_body_preview(receive)
                 if body:
-                    # Only log first 1000 characters to avoid huge logs
-                    request_data["body_preview"] = body.decode()[:1000]
+                    request_data["body_preview"] = body.decode("utf-8", "replace")
             except Exception:
                 request_data["body_preview"] = "Could not decode body"
         
-        security_logger.info("REQUEST", extra=request_data)
+        security_logger.info("REQUEST", **request_data)
+        
+        # Make the request details available to audit events raised while
+        # handling it, without them having to inspect the request again
+        audit_meta_token = request_audit_meta_var.set({
+            "ip_address": request_data["ip"],
+            "user_agent": request_data["user_agent"],
+            "method": request_data["method"],
+            "url": request_data["url"],
+        })
+        
+        status_code = None
+        
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
         
         # Process request
         try:
-            response = await call_next(request)
+            await self.app(scope, receive, send_with_status)
             
             # Log response
             process_time = time.time() - start_time
             response_data = {
-                "status_code": response.status_code,
+                "status_code": status_code,
                 "process_time": round(process_time, 4),
                 "method": request.method,
-                "url": str(request.url),
-                "ip": request.client.host if request.client else None,
+                "url": request_data["url"],
+                "ip": request_data["ip"],
             }
             
-            security_logger.info("RESPONSE", extra=response_data)
-            
-            return response
+            security_logger.info("RESPONSE", **response_data)
             
         except Exception as e:
             # Log error
@@ -281,29 +473,44 @@ class RequestLoggingMiddleware(BaseHTTPMiddleware):
                 "error": str(e),
                 "process_time": round(process_time, 4),
                 "method": request.method,
-                "url": str(request.url),
-                "ip": request.client.host if request.client else None,
+                "url": request_data["url"],
+                "ip": request_data["ip"],
             }
             
-            security_logger.error("REQUEST_ERROR", extra=error_data)
+            security_logger.error("REQUEST_ERROR", **error_data)
             raise
+        
+        finally:
+            request_audit_meta_var.reset(audit_meta_token)
 
-class CORSSecurityMiddleware(BaseHTTPMiddleware):
+class CORSSecurityMiddleware:
     """Enhanced CORS middleware with security considerations"""
     
     def __init__(
         self,
-        app,
+        app: ASGIApp,
         allowed_origins: List[str],
         allowed_methods: List[str] = ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
         allowed_headers: List[str] = ["Authorization", "Content-Type"],
         max_age: int = 3600
     ):
-        super().__init__(app)
+        self.app = app
         self.allowed_origins = set(allowed_origins)
         self.allowed_methods = allowed_methods
         self.allowed_headers = allowed_headers
         self.max_age = max_age
+        
+        # Preflight responses only vary by origin, so build the rest once
+        self._preflight_headers = [
+            (b"access-control-allow-methods", ", ".join(allowed_methods).encode("latin-1")),
+            (b"access-control-allow-headers", ", ".join(allowed_headers).encode("latin-1")),
+            (b"access-control-max-age", str(max_age).encode("latin-1")),
+            (b"access-control-allow-credentials", b"true"),
+            (b"content-length", b"0"),
+        ]
+        self._forbidden_body = json.dumps(
+            {"error": "Origin not allowed"}, separators=(",", ":")
+        ).encode("utf-8")
     
     def _is_origin_allowed(self, origin: str) -> bool:
         """Check if origin is allowed"""
@@ -311,28 +518,53 @@ class CORSSecurityMiddleware(BaseHTTPMiddleware):
             return True
         return origin in self.allowed_origins
     
-    async def dispatch(self, request: Request, call_next):
-        origin = request.headers.get("origin")
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        origin = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value.decode("latin-1")
+                break
+        allowed = origin is not None and self._is_origin_allowed(origin)
         
         # Handle preflight requests
-        if request.method == "OPTIONS":
-            if origin and self._is_origin_allowed(origin):
-                response = Response()
-                response.headers["Access-Control-Allow-Origin"] = origin
-                response.headers["Access-Control-Allow-Methods"] = ", ".join(self.allowed_methods)
-                response.headers["Access-Control-Allow-Headers"] = ", ".join(self.allowed_headers)
-                response.headers["Access-Control-Max-Age"] = str(self.max_age)
-                response.headers["Access-Control-Allow-Credentials"] = "true"
-                return response
+        if scope["method"] == "OPTIONS":
+            if allowed:
+                await send({
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [
+                        (b"access-control-allow-origin", origin.encode("latin-1")),
+                        *self._preflight_headers,
+                    ],
+                })
+                await send({"type": "http.response.body", "body": b""})
             else:
-                return JSONResponse(status_code=403, content={"error": "Origin not allowed"})
+                await send({
+                    "type": "http.response.start",
+                    "status": 403,
+                    "headers": [
+                        (b"content-length", str(len(self._forbidden_body)).encode("latin-1")),
+                        (b"content-type", b"application/json"),
+                    ],
+                })
+                await send({"type": "http.response.body", "body": self._forbidden_body})
+            return
         
-        # Process actual request
-        response = await call_next(request)
+        if not allowed:
+            await self.app(scope, receive, send)
+            return
         
-        # Add CORS headers to response
-        if origin and self._is_origin_allowed(origin):
-            response.headers["Access-Control-Allow-Origin"] = origin
-            response.headers["Access-Control-Allow-Credentials"] = "true"
+        # Add CORS headers to response, replacing any the endpoint set
+        async def send_with_cors(message: Message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                headers = MutableHeaders(scope=message)
+                headers["Access-Control-Allow-Origin"] = origin
+                headers["Access-Control-Allow-Credentials"] = "true"
+            await send(message)
         
-        return response
+        await self.app(scope, receive, send_with_cors)
@@ -7,52 +7,103 @@ This module provides comprehensive RBAC functionality including:
 - Resource-based access control
 - Audit logging
 """
-from enum import Enum
-from typing import List, Dict, Any, Optional, Set
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import Enum, IntEnum
+from typing import Callable, List, Dict, Any, FrozenSet, Optional, Set, Tuple
 from functools import wraps
 from fastapi import HTTPException, Request
+import atexit
 import logging
+import os
+import queue
+import threading
+import time
 
 # Configure audit logger
 audit_logger = logging.getLogger("agentichr.audit")
 audit_logger.setLevel(logging.INFO)
 
-class Permission(Enum):
-    """System permissions"""
+# Audit events are buffered and handed to the audit logger's handlers from a
+# background thread, so request handling never waits on log I/O
+AUDIT_QUEUE_SIZE = int(os.getenv("AUDIT_QUEUE_SIZE", "10000"))
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "256"))
+AUDIT_BUFFER_TIME = int(os.getenv("AUDIT_BUFFER_TIME", "100")) / 1000
+# Identical events within this window are written once with a count; 0 disables
+AUDIT_COALESCE_WINDOW = int(os.getenv("AUDIT_COALESCE_WINDOW_MS", "1000")) / 1000
+
+# Request metadata (ip_address, user_agent, method, url) for audit events,
+# captured once per request by RequestLoggingMiddleware
+request_audit_meta_var: ContextVar[Optional[Dict[str, Any]]] = ContextVar(
+    "request_audit_meta", default=None
+)
+
+class Permission(IntEnum):
+    """System permissions
+    
+    Each permission is a single bit, so a set of permissions is held as an
+    int bitmask and checked with plain int operations. The string form used
+    in messages and audit records is available as ``code``.
+    """
+    
+    def __new__(cls, bit: int, code: str):
+        member = int.__new__(cls, bit)
+        member._value_ = bit
+        member.code = code
+        return member
+    
     # Employee permissions
-    EMPLOYEE_READ = "employee:read"
-    EMPLOYEE_WRITE = "employee:write"
-    EMPLOYEE_DELETE = "employee:delete"
-    EMPLOYEE_READ_ALL = "employee:read:all"
+    EMPLOYEE_READ = 1 << 0, "employee:read"
+    EMPLOYEE_WRITE = 1 << 1, "employee:write"
+    EMPLOYEE_DELETE = 1 << 2, "employee:delete"
+    EMPLOYEE_READ_ALL = 1 << 3, "employee:read:all"
     
     # Attendance permissions
-    ATTENDANCE_READ = "attendance:read"
-    ATTENDANCE_WRITE = "attendance:write"
-    ATTENDANCE_READ_ALL = "attendance:read:all"
-    ATTENDANCE_MANAGE = "attendance:manage"
+    ATTENDANCE_READ = 1 << 4, "attendance:read"
+    ATTENDANCE_WRITE = 1 << 5, "attendance:write"
+    ATTENDANCE_READ_ALL = 1 << 6, "attendance:read:all"
+    ATTENDANCE_MANAGE = 1 << 7, "attendance:manage"
     
     # Leave permissions
-    LEAVE_READ = "leave:read"
-    LEAVE_WRITE = "leave:write"
-    LEAVE_APPROVE = "leave:approve"
-    LEAVE_READ_ALL = "leave:read:all"
-    LEAVE_MANAGE = "leave:manage"
+    LEAVE_READ = 1 << 8, "leave:read"
+    LEAVE_WRITE = 1 << 9, "leave:write"
+    LEAVE_APPROVE = 1 << 10, "leave:approve"
+    LEAVE_READ_ALL = 1 << 11, "leave:read:all"
+    LEAVE_MANAGE = 1 << 12, "leave:manage"
     
     # User management permissions
-    USER_READ = "user:read"
-    USER_WRITE = "user:write"
-    USER_DELETE = "user:delete"
-    USER_MANAGE = "user:manage"
+    USER_READ = 1 << 13, "user:read"
+    USER_WRITE = 1 << 14, "user:write"
+    USER_DELETE = 1 << 15, "user:delete"
+    USER_MANAGE = 1 << 16, "user:manage"
     
     # System permissions
-    SYSTEM_ADMIN = "system:admin"
-    AUDIT_READ = "audit:read"
-    REPORTS_READ = "reports:read"
-    REPORTS_GENERATE = "reports:generate"
+    SYSTEM_ADMIN = 1 << 17, "system:admin"
+    AUDIT_READ = 1 << 18, "audit:read"
+    REPORTS_READ = 1 << 19, "reports:read"
+    REPORTS_GENERATE = 1 << 20, "reports:generate"
     
     # Workflow permissions
-    WORKFLOW_READ = "workflow:read"
-    WORKFLOW_MANAGE = "workflow:manage"
+    WORKFLOW_READ = 1 << 21, "workflow:read"
+    WORKFLOW_MANAGE = 1 << 22, "workflow:manage"
+    
+    @classmethod
+    def from_code(cls, code: str) -> "Permission":
+        """Look up a permission by its string code"""
+        for permission in cls:
+            if permission.code == code:
+                return permission
+        raise ValueError(f"{code!r} is not a valid {cls.__name__}")
+
+# Sentinel bit that satisfies every permission check
+_SYSTEM_ADMIN = int(Permission.SYSTEM_ADMIN)
+
+def permissions_mask(permissions) -> int:
+    """Combine permissions into a bitmask"""
+    mask = 0
+    for permission in permissions:
+        mask |= permission
+    return mask
 
 class Role(Enum):
     """System roles with their permissions"""
@@ -100,8 +151,9 @@ ROLE_PERMISSIONS: Dict[Role, Set[Permission]] = {
         Permission.WORKFLOW_MANAGE,
     },
     Role.SYSTEM_ADMIN: {
-        # System admins have all permissions
-        *Permission
+        # System admins have all permissions; the checks below treat this
+        # bit as granting everything
+        Permission.SYSTEM_ADMIN
     },
     Role.AUDITOR: {
         Permission.EMPLOYEE_READ,
@@ -116,38 +168,70 @@ ROLE_PERMISSIONS: Dict[Role, Set[Permission]] = {
     }
 }
 
+# Role value -> permission bitmask, precomputed from ROLE_PERMISSIONS so role
+# strings from the token are resolved with a dict lookup instead of Role(...)
+ROLE_MASKS: Dict[str, int] = {
+    role.value: permissions_mask(permissions)
+    for role, permissions in ROLE_PERMISSIONS.items()
+}
+
+_MANAGER_ROLE = Role.MANAGER.value
+
+@dataclass(slots=True)
 class AccessContext:
     """Context for access control decisions"""
-    def __init__(
-        self,
-        user_id: int,
-        roles: List[str],
-        permissions: Set[Permission],
-        tenant_id: Optional[str] = None,
-        department: Optional[str] = None,
-        manager_id: Optional[int] = None
-    ):
-        self.user_id = user_id
-        self.roles = roles
-        self.permissions = permissions
-        self.tenant_id = tenant_id
-        self.department = department
-        self.manager_id = manager_id
-
-def get_permissions_for_roles(roles: List[str]) -> Set[Permission]:
-    """Get all permissions for given roles"""
-    permissions = set()
-    for role_str in roles:
-        try:
-            role = Role(role_str)
-            permissions.update(ROLE_PERMISSIONS.get(role, set()))
-        except ValueError:
-            # Unknown role, skip
-            continue
-    return permissions
+    user_id: int
+    roles: FrozenSet[str]
+    permissions: int
+    tenant_id: Optional[str] = None
+    department: Optional[str] = None
+    manager_id: Optional[int] = None
+    
+    def __post_init__(self):
+        # Role checks are membership tests, so keep roles as a set
+        if not isinstance(self.roles, frozenset):
+            self.roles = frozenset(self.roles)
+
+# Key under which the computed AccessContext is kept on the auth data, so
+# stacked decorators on one request build it only once
+ACCESS_CONTEXT_KEY = "_ctx"
+
+# Sorted role tuple -> permission bitmask. Role combinations repeat heavily
+# across users, so this stays small and almost every lookup is a hit.
+_role_mask_cache: Dict[Tuple[str, ...], int] = {}
+
+def get_permissions_for_roles(roles: List[str]) -> int:
+    """Get the permission bitmask for given roles"""
+    key = tuple(sorted(roles))
+    mask = _role_mask_cache.get(key)
+    if mask is None:
+        mask = 0
+        for role_str in key:
+            # Unknown roles contribute no permissions
+            mask |= ROLE_MASKS.get(role_str, 0)
+        _role_mask_cache[key] = mask
+    return mask
+
+def invalidate_role(role_str: Optional[str] = None):
+    """Drop cached permission masks for a role, or all of them"""
+    if role_str is None:
+        _role_mask_cache.clear()
+        return
+    for key in [key for key in _role_mask_cache if role_str in key]:
+        _role_mask_cache.pop(key, None)
+
+def set_role_permissions(role: Role, permissions: Set[Permission]):
+    """Replace the permissions granted to a role"""
+    ROLE_PERMISSIONS[role] = set(permissions)
+    ROLE_MASKS[role.value] = permissions_mask(permissions)
+    invalidate_role(role.value)
 
 def create_access_context(auth_data: Dict[str, Any]) -> AccessContext:
     """Create access context from auth data"""
+    context = auth_data.get(ACCESS_CONTEXT_KEY)
+    if context is not None:
+        return context
+    
     user_id = auth_data.get("user_id", 0)
     roles = auth_data.get("roles", [])
     tenant_id = auth_data.get("tenant_id")
@@ -156,7 +240,7 @@ def create_access_context(auth_data: Dict[str, Any]) -> AccessContext:
     
     permissions = get_permissions_for_roles(roles)
     
-    return AccessContext(
+    context = AccessContext(
         user_id=user_id,
         roles=roles,
         permissions=permissions,
@@ -164,18 +248,66 @@ def create_access_context(auth_data: Dict[str, Any]) -> AccessContext:
         department=department,
         manager_id=manager_id
     )
+    auth_data[ACCESS_CONTEXT_KEY] = context
+    return context
 
 def has_permission(context: AccessContext, permission: Permission) -> bool:
     """Check if context has specific permission"""
-    return permission in context.permissions
+    return bool(context.permissions & (permission | _SYSTEM_ADMIN))
 
 def has_any_permission(context: AccessContext, permissions: List[Permission]) -> bool:
     """Check if context has any of the specified permissions"""
-    return any(perm in context.permissions for perm in permissions)
+    return bool(context.permissions & (permissions_mask(permissions) | _SYSTEM_ADMIN))
 
 def has_all_permissions(context: AccessContext, permissions: List[Permission]) -> bool:
     """Check if context has all specified permissions"""
-    return all(perm in context.permissions for perm in permissions)
+    granted = context.permissions
+    if granted & _SYSTEM_ADMIN:
+        return True
+    required = permissions_mask(permissions)
+    return granted & required == required
+
+def _own_or_all_check(read: Permission, read_all: Permission) -> Callable[..., bool]:
+    """Build a check allowing owners with ``read`` and anyone with ``read_all``"""
+    read = int(read)
+    read_all = int(read_all)
+    
+    def check(context: AccessContext, resource_owner_id, resource_department) -> bool:
+        granted = context.permissions
+        # Can read all resources of the type if has permission
+        if granted & read_all:
+            return True
+        # Can read own resources
+        return bool(granted & read) and resource_owner_id == context.user_id
+    
+    return check
+
+_EMPLOYEE_READ = int(Permission.EMPLOYEE_READ)
+_EMPLOYEE_READ_ALL = int(Permission.EMPLOYEE_READ_ALL)
+
+def _check_employee(context: AccessContext, resource_owner_id, resource_department) -> bool:
+    granted = context.permissions
+    
+    # Can read all employees if has permission
+    if granted & _EMPLOYEE_READ_ALL:
+        return True
+    
+    if not granted & _EMPLOYEE_READ:
+        return False
+    
+    # Can read own employee record
+    if resource_owner_id == context.user_id:
+        return True
+    
+    # Managers can read employees in their department
+    return resource_department == context.department and _MANAGER_ROLE in context.roles
+
+# Resource type -> access check
+_RESOURCE_CHECKS: Dict[str, Callable[..., bool]] = {
+    "employee": _check_employee,
+    "attendance": _own_or_all_check(Permission.ATTENDANCE_READ, Permission.ATTENDANCE_READ_ALL),
+    "leave": _own_or_all_check(Permission.LEAVE_READ, Permission.LEAVE_READ_ALL),
+}
 
 def can_access_resource(
     context: AccessContext,
@@ -187,44 +319,16 @@ def can_access_resource(
     """Check if context can access specific resource"""
     
     # System admins can access everything
-    if Permission.SYSTEM_ADMIN in context.permissions:
+    if context.permissions & _SYSTEM_ADMIN:
         return True
     
-    # Resource-specific logic
-    if resource_type == "employee":
-        # Can read own employee record
-        if resource_owner_id == context.user_id and Permission.EMPLOYEE_READ in context.permissions:
-            return True
-        
-        # Can read all employees if has permission
-        if Permission.EMPLOYEE_READ_ALL in context.permissions:
-            return True
-        
-        # Managers can read employees in their department
-        if (Permission.EMPLOYEE_READ in context.permissions and 
-            resource_department == context.department and
-            Role.MANAGER.value in context.roles):
-            return True
-    
-    elif resource_type == "attendance":
-        # Can read own attendance
-        if resource_owner_id == context.user_id and Permission.ATTENDANCE_READ in context.permissions:
-            return True
-        
-        # Can read all attendance if has permission
-        if Permission.ATTENDANCE_READ_ALL in context.permissions:
-            return True
-    
-    elif resource_type == "leave":
-        # Can read own leave requests
-        if resource_owner_id == context.user_id and Permission.LEAVE_READ in context.permissions:
-            return True
-        
-        # Can read all leave requests if has permission
-        if Permission.LEAVE_READ_ALL in context.permissions:
-            return True
-    
-    return False
+    check = _RESOURCE_CHECKS.get(resource_type)
+    if check is None:
+        return False
+    return check(context, resource_owner_id, resource_department)
+
+# Shared details for events logged without any; records only read it
+_NO_DETAILS: Dict[str, Any] = {}
 
 def audit_log(
     action: str,
@@ -236,13 +340,16 @@ def audit_log(
     request: Optional[Request] = None
 ):
     """Log audit event"""
+    if not audit_logger.isEnabledFor(logging.INFO):
+        return
+    
     audit_data = {
         "action": action,
         "resource_type": resource_type,
         "resource_id": resource_id,
         "user_id": user_id,
         "success": success,
-        "details": details or {},
+        "details": details if details is not None else _NO_DETAILS,
     }
     
     if request:
@@ -252,12 +359,156 @@ def audit_log(
             "method": request.method,
             "url": str(request.url),
         })
+    else:
+        request_meta = request_audit_meta_var.get()
+        if request_meta:
+            audit_data.update(request_meta)
+    
+    record = audit_logger.makeRecord(
+        audit_logger.name, logging.INFO, __file__, 0, "AUDIT", (), None, extra=audit_data
+    )
+    _audit_buffer.put(record)
+
+class _AuditBuffer:
+    """Bounded queue of audit records drained in batches by a daemon thread
+    
+    Events with the same user, action, resource and outcome arriving within
+    the coalesce window are written as one record carrying ``count`` and
+    ``last_seen``, so a client hammering a protected endpoint does not
+    produce thousands of identical entries.
+    """
+    
+    def __init__(
+        self,
+        maxsize: int,
+        batch_size: int,
+        flush_interval: float,
+        coalesce_window: float = 0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.queue: queue.Queue = queue.Queue(maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.coalesce_window = coalesce_window
+        self._clock = clock
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._pending: Dict[tuple, logging.LogRecord] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+    
+    def put(self, record: logging.LogRecord):
+        """Enqueue a record, dropping it if the buffer is full"""
+        if self._thread is None:
+            self._start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+    
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="audit-log-writer", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.flush)
+    
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            with self._write_lock:
+                self._write(self._coalesce(batch))
     
-    audit_logger.info("AUDIT", extra=audit_data)
+    def _next_batch(self) -> List[logging.LogRecord]:
+        """Wait for events and collect them until the batch is full or due"""
+        batch = []
+        try:
+            # Only wake up without new events when coalesced ones are waiting
+            batch.append(self.queue.get(timeout=self.flush_interval if self._pending else None))
+            # One deadline per batch, so steady traffic cannot postpone the write
+            deadline = self._clock() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    break
+                batch.append(self.queue.get(timeout=remaining))
+        except queue.Empty:
+            pass
+        return batch
+    
+    def _coalesce(self, batch: List[logging.LogRecord], flush_all: bool = False) -> List[logging.LogRecord]:
+        """Merge repeated events and return the records ready to be written"""
+        if not self.coalesce_window:
+            return batch
+        
+        ready = []
+        pending = self._pending
+        for record in batch:
+            key = (
+                record.user_id, record.action, record.resource_type,
+                record.resource_id, record.success
+            )
+            first = pending.get(key)
+            if first is not None and record.created - first.created < self.coalesce_window:
+                first.count += 1
+                first.last_seen = record.created
+                continue
+            if first is not None:
+                ready.append(first)
+            record.count = 1
+            record.last_seen = record.created
+            pending[key] = record
+        
+        cutoff = time.time() - self.coalesce_window
+        for key, record in list(pending.items()):
+            if flush_all or record.created <= cutoff:
+                ready.append(pending.pop(key))
+        
+        return ready
+    
+    def _write(self, batch: List[logging.LogRecord]):
+        for record in batch:
+            try:
+                audit_logger.handle(record)
+            except Exception:
+                pass
+        
+        dropped = self.dropped
+        if dropped != self._reported_dropped:
+            audit_logger.warning(
+                "Audit buffer full, dropped %d events", dropped - self._reported_dropped
+            )
+            self._reported_dropped = dropped
+    
+    def flush(self):
+        """Write out whatever is currently buffered"""
+        batch = []
+        try:
+            while True:
+                batch.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        with self._write_lock:
+            self._write(self._coalesce(batch, flush_all=True))
+
+_audit_buffer = _AuditBuffer(
+    AUDIT_QUEUE_SIZE, AUDIT_BUFFER_SIZE, AUDIT_BUFFER_TIME, AUDIT_COALESCE_WINDOW
+)
 
 def require_permission(permission: Permission):
     """Decorator to require specific permission"""
+    # Everything the check and the denial need is fixed when the decorator
+    # is applied, so build it once here rather than on each request
+    required = permission | _SYSTEM_ADMIN
+    denied_details = {"required_permission": permission.code}
+    denied_message = f"Permission required: {permission.code}"
+    
     def decorator(func):
+        denied_action = f"access_denied_{func.__name__}"
+        
         @wraps(func)
         async def wrapper(*args, **kwargs):
             # Extract auth context from kwargs
@@ -267,19 +518,16 @@ def require_permission(permission: Permission):
             
             context = create_access_context(auth)
             
-            if not has_permission(context, permission):
+            if not context.permissions & required:
                 audit_log(
-                    action=f"access_denied_{func.__name__}",
+                    action=denied_action,
                     resource_type="endpoint",
                     resource_id=None,
                     user_id=context.user_id,
                     success=False,
-                    details={"required_permission": permission.value}
-                )
-                raise HTTPException(
-                    status_code=403, 
-                    detail=f"Permission required: {permission.value}"
+                    details=denied_details
                 )
+                raise HTTPException(status_code=403, detail=denied_message)
             
             # Add context to kwargs for use in endpoint
             kwargs["access_context"] = context
@@ -290,7 +538,14 @@ def require_permission(permission: Permission):
 
 def require_any_permission(permissions: List[Permission]):
     """Decorator to require any of the specified permissions"""
+    required = permissions_mask(permissions) | _SYSTEM_ADMIN
+    permission_values = [p.code for p in permissions]
+    denied_details = {"required_permissions": permission_values}
+    denied_message = f"One of these permissions required: {permission_values}"
+    
     def decorator(func):
+        denied_action = f"access_denied_{func.__name__}"
+        
         @wraps(func)
         async def wrapper(*args, **kwargs):
             auth = kwargs.get("auth")
@@ -299,19 +554,16 @@ def require_any_permission(permissions: List[Permission]):
             
             context = create_access_context(auth)
             
-            if not has_any_permission(context, permissions):
+            if not context.permissions & required:
                 audit_log(
-                    action=f"access_denied_{func.__name__}",
+                    action=denied_action,
                     resource_type="endpoint",
                     resource_id=None,
                     user_id=context.user_id,
                     success=False,
-                    details={"required_permissions": [p.value for p in permissions]}
-                )
-                raise HTTPException(
-                    status_code=403, 
-                    detail=f"One of these permissions required: {[p.value for p in permissions]}"
+                    details=denied_details
                 )
+                raise HTTPException(status_code=403, detail=denied_message)
             
             kwargs["access_context"] = context
             return await func(*args, **kwargs)
@@ -320,7 +572,11 @@ def require_any_permission(permissions: List[Permission]):
 
 def require_resource_access(resource_type: str, resource_id_param: str = "id"):
     """Decorator to require access to specific resource"""
+    denied_message = f"Access denied to {resource_type} resource"
+    
     def decorator(func):
+        denied_action = f"resource_access_denied_{func.__name__}"
+        
         @wraps(func)
         async def wrapper(*args, **kwargs):
             auth = kwargs.get("auth")
@@ -334,16 +590,13 @@ def require_resource_access(resource_type: str, resource_id_param: str = "id"):
             # In a real implementation, you'd fetch resource details from DB
             if not can_access_resource(context, resource_type, resource_id):
                 audit_log(
-                    action=f"resource_access_denied_{func.__name__}",
+                    action=denied_action,
                     resource_type=resource_type,
                     resource_id=resource_id,
                     user_id=context.user_id,
                     success=False
                 )
-                raise HTTPException(
-                    status_code=403, 
-                    detail=f"Access denied to {resource_type} resource"
-                )
+                raise HTTPException(status_code=403, detail=denied_message)
             
             kwargs["access_context"] = context
             return await func(*args, **kwargs)
@@ -352,7 +605,13 @@ def require_resource_access(resource_type: str, resource_id_param: str = "id"):
 
 def require_role(role: Role):
     """Decorator to require specific role"""
+    required_role = role.value
+    denied_details = {"required_role": required_role}
+    denied_message = f"Role required: {required_role}"
+    
     def decorator(func):
+        denied_action = f"role_access_denied_{func.__name__}"
+        
         @wraps(func)
         async def wrapper(*args, **kwargs):
             auth = kwargs.get("auth")
@@ -361,19 +620,16 @@ def require_role(role: Role):
             
             context = create_access_context(auth)
             
-            if role.value not in context.roles:
+            if required_role not in context.roles:
                 audit_log(
-                    action=f"role_access_denied_{func.__name__}",
+                    action=denied_action,
                     resource_type="endpoint",
                     resource_id=None,
                     user_id=context.user_id,
                     success=False,
-                    details={"required_role": role.value}
-                )
-                raise HTTPException(
-                    status_code=403, 
-                    detail=f"Role required: {role.value}"
+                    details=denied_details
                 )
+                raise HTTPException(status_code=403, detail=denied_message)
             
             kwargs["access_context"] = context
             return await func(*args, **kwargs)
@@ -0,0 +1,156 @@
+import logging
+import queue
+import time
+
+from py_hrms_auth import rbac
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+class _ScriptedQueue:
+    """Queue delivering one event every ``gap`` seconds of the fake clock"""
+
+    def __init__(self, clock, gap, events=None):
+        self.clock = clock
+        self.gap = gap
+        self.events = events
+        self.timeouts = []
+        self._next_at = clock.now
+
+    def get(self, timeout=None):
+        self.timeouts.append(timeout)
+        if self.events == 0:
+            self.clock.now += timeout
+            raise queue.Empty
+        if timeout is not None and self._next_at - self.clock.now > timeout:
+            self.clock.now += timeout
+            raise queue.Empty
+        self.clock.now = max(self.clock.now, self._next_at)
+        self._next_at = self.clock.now + self.gap
+        if self.events is not None:
+            self.events -= 1
+        return _record()
+
+
+class _RecordingLogger:
+    def __init__(self):
+        self.written = []
+
+    def handle(self, record):
+        self.written.append(record)
+
+    def warning(self, *args):
+        pass
+
+
+def _record(user_id=1, action="access_denied_get_employee", created=None):
+    record = logging.LogRecord("agentichr.audit", logging.INFO, __file__, 0, "AUDIT", (), None)
+    record.user_id = user_id
+    record.action = action
+    record.resource_type = "endpoint"
+    record.resource_id = None
+    record.success = False
+    if created is not None:
+        record.created = created
+    return record
+
+
+def test_steady_traffic_is_flushed_within_interval():
+    clock = _Clock()
+    buffer = rbac._AuditBuffer(maxsize=1000, batch_size=1000, flush_interval=0.2, clock=clock)
+    # One event every 20 ms, indefinitely
+    buffer.queue = _ScriptedQueue(clock, gap=0.02)
+
+    started = clock.now
+    batch = buffer._next_batch()
+
+    assert clock.now - started <= 0.2 + 1e-9
+    assert len(batch) == 11
+
+
+def test_full_batch_is_written_without_waiting():
+    clock = _Clock()
+    buffer = rbac._AuditBuffer(maxsize=1000, batch_size=5, flush_interval=0.2, clock=clock)
+    buffer.queue = _ScriptedQueue(clock, gap=0)
+
+    assert len(buffer._next_batch()) == 5
+    assert clock.now == 100.0
+
+
+def test_idle_buffer_blocks_until_an_event_arrives():
+    clock = _Clock()
+    buffer = rbac._AuditBuffer(maxsize=1000, batch_size=1000, flush_interval=0.2, clock=clock)
+    buffer.queue = _ScriptedQueue(clock, gap=0.02, events=1)
+
+    assert len(buffer._next_batch()) == 1
+    assert buffer.queue.timeouts[0] is None
+
+
+def test_pending_coalesced_events_wake_the_writer():
+    clock = _Clock()
+    buffer = rbac._AuditBuffer(
+        maxsize=1000, batch_size=1000, flush_interval=0.2, coalesce_window=60, clock=clock
+    )
+    buffer._coalesce([_record()])
+    buffer.queue = _ScriptedQueue(clock, gap=0.02, events=0)
+
+    assert buffer._next_batch() == []
+    assert buffer.queue.timeouts == [0.2]
+
+
+def test_repeated_events_are_coalesced(monkeypatch):
+    recorder = _RecordingLogger()
+    monkeypatch.setattr(rbac, "audit_logger", recorder)
+    buffer = rbac._AuditBuffer(maxsize=1000, batch_size=1000, flush_interval=0.2, coalesce_window=60)
+
+    now = time.time()
+    for offset in range(5):
+        buffer.queue.put_nowait(_record(created=now + offset))
+    buffer.queue.put_nowait(_record(user_id=2, created=now))
+    buffer.queue.put_nowait(_record(action="access_denied_delete_employee", created=now))
+
+    # Still inside the window, so the repeated events stay pending
+    assert buffer._coalesce([buffer.queue.get_nowait() for _ in range(7)]) == []
+
+    buffer.flush()
+
+    counts = {(record.user_id, record.action): record.count for record in recorder.written}
+    assert counts == {
+        (1, "access_denied_get_employee"): 5,
+        (2, "access_denied_get_employee"): 1,
+        (1, "access_denied_delete_employee"): 1,
+    }
+    first = next(record for record in recorder.written if record.count == 5)
+    assert first.created == now
+    assert first.last_seen == now + 4
+
+
+def test_events_outside_the_window_are_written_separately(monkeypatch):
+    recorder = _RecordingLogger()
+    monkeypatch.setattr(rbac, "audit_logger", recorder)
+    buffer = rbac._AuditBuffer(maxsize=1000, batch_size=1000, flush_interval=0.2, coalesce_window=1)
+
+    # Old enough that both windows have closed
+    start = time.time() - 60
+    ready = buffer._coalesce([
+        _record(created=start),
+        _record(created=start + 0.5),
+        _record(created=start + 2),
+    ])
+
+    assert [record.count for record in ready] == [2, 1]
+    assert buffer._pending == {}
+    assert recorder.written == []
+
+
+def test_coalescing_disabled_passes_events_through():
+    buffer = rbac._AuditBuffer(maxsize=1000, batch_size=1000, flush_interval=0.2)
+    batch = [_record(), _record()]
+
+    assert buffer._coalesce(batch) is batch
@@ -0,0 +1,57 @@
+import pytest
+
+from py_hrms_auth.middleware import CORSSecurityMiddleware
+
+ORIGIN = "https://app.example.com"
+
+
+async def _app_with_own_cors(scope, receive, send):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"access-control-allow-origin", b"*"),
+            (b"access-control-allow-credentials", b"false"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _response_headers(app, origin):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"origin", origin.encode("latin-1"))],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["headers"]
+
+
+@pytest.mark.asyncio
+async def test_cors_headers_replace_endpoint_values():
+    app = CORSSecurityMiddleware(_app_with_own_cors, allowed_origins=[ORIGIN])
+
+    headers = await _response_headers(app, ORIGIN)
+
+    assert [value for name, value in headers if name == b"access-control-allow-origin"] == [ORIGIN.encode()]
+    assert [value for name, value in headers if name == b"access-control-allow-credentials"] == [b"true"]
+    assert (b"content-type", b"application/json") in headers
+
+
+@pytest.mark.asyncio
+async def test_disallowed_origin_leaves_headers_untouched():
+    app = CORSSecurityMiddleware(_app_with_own_cors, allowed_origins=[ORIGIN])
+
+    headers = await _response_headers(app, "https://evil.example.com")
+
+    assert (b"access-control-allow-origin", b"*") in headers
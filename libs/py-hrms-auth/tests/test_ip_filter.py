@@ -0,0 +1,95 @@
+import pytest
+
+from py_hrms_auth.middleware import IPFilterMiddleware, _NetworkSet
+
+
+async def _app(scope, receive, send):
+    pass
+
+
+@pytest.mark.parametrize(
+    "networks, ip, expected",
+    [
+        # Exact addresses
+        (["10.0.0.1"], "10.0.0.1", True),
+        (["10.0.0.1"], "10.0.0.2", False),
+        (["2001:db8::1"], "2001:db8::1", True),
+        (["2001:db8::1"], "2001:db8::2", False),
+        # Host networks
+        (["10.0.0.1/32"], "10.0.0.1", True),
+        (["10.0.0.1/32"], "10.0.0.0", False),
+        (["2001:db8::1/128"], "2001:db8::1", True),
+        (["2001:db8::1/128"], "2001:db8::", False),
+        # Whole address space, per family
+        (["0.0.0.0/0"], "203.0.113.9", True),
+        (["0.0.0.0/0"], "2001:db8::1", False),
+        (["::/0"], "2001:db8::1", True),
+        (["::/0"], "203.0.113.9", False),
+        # CIDR ranges, including host bits set in the entry
+        (["192.168.1.0/24"], "192.168.1.255", True),
+        (["192.168.1.0/24"], "192.168.2.0", False),
+        (["192.168.1.77/24"], "192.168.1.1", True),
+        (["2001:db8::/32"], "2001:db8:ffff::1", True),
+        (["2001:db8::/32"], "2001:db9::1", False),
+        # IPv4-mapped IPv6 addresses are a different family
+        (["10.0.0.1"], "::ffff:10.0.0.1", False),
+    ],
+)
+def test_network_set_membership(networks, ip, expected):
+    assert (ip in _NetworkSet(networks)) is expected
+
+
+MIXED = ["10.0.0.0/8", "192.168.1.1", "2001:db8::/48", "fe80::1/128"]
+
+
+@pytest.mark.parametrize(
+    "ip, expected",
+    [
+        ("10.255.0.1", True),
+        ("11.0.0.1", False),
+        ("192.168.1.1", True),
+        ("192.168.1.2", False),
+        ("2001:db8:0:1::5", True),
+        ("2001:db8:1::5", False),
+        ("fe80::1", True),
+        ("fe80::2", False),
+    ],
+)
+def test_network_set_mixed_families(ip, expected):
+    networks = _NetworkSet(MIXED)
+
+    assert len(networks) == 4
+    assert (ip in networks) is expected
+
+
+@pytest.mark.parametrize("ip", ["unknown", "testclient", "", "10.0.0", "10.0.0.256", "2001:db8::g", "10.0.0.1/32"])
+def test_network_set_rejects_invalid_addresses(ip):
+    assert ip not in _NetworkSet(["0.0.0.0/0", "::/0"])
+
+
+def test_empty_network_set():
+    networks = _NetworkSet([])
+
+    assert not networks
+    assert "10.0.0.1" not in networks
+
+
+@pytest.mark.parametrize(
+    "allowed, blocked, ip, expected",
+    [
+        (None, None, "10.0.0.1", True),
+        (None, ["10.0.0.0/8"], "10.1.2.3", False),
+        (None, ["10.0.0.0/8"], "192.168.0.1", True),
+        (["10.0.0.0/8"], ["10.0.0.5"], "10.0.0.5", False),
+        (["10.0.0.0/8"], ["10.0.0.5"], "10.0.0.6", True),
+        (["10.0.0.0/8"], None, "2001:db8::1", False),
+        # Unparseable client addresses never match an entry, as with the
+        # previous exact string matching
+        (["10.0.0.0/8"], None, "unknown", False),
+        (None, ["0.0.0.0/0", "::/0"], "unknown", True),
+    ],
+)
+def test_ip_filter_decisions(allowed, blocked, ip, expected):
+    middleware = IPFilterMiddleware(_app, allowed_ips=allowed, blocked_ips=blocked)
+
+    assert middleware._is_ip_allowed(ip) is expected
@@ -0,0 +1,80 @@
+import pytest
+
+from py_hrms_auth import middleware
+from py_hrms_auth.middleware import RateLimitMiddleware
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+async def _ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def _request(app, client_ip="10.0.0.1"):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "server": ("testserver", 80),
+        "root_path": "",
+        "path": "/employees",
+        "raw_path": b"/employees",
+        "query_string": b"",
+        "headers": [],
+        "client": (client_ip, 50000),
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(middleware.time, "monotonic", clock)
+    return clock
+
+
+@pytest.mark.asyncio
+async def test_burst_then_429_then_refill(clock):
+    # 3 tokens, refilled at one token every 20 seconds
+    app = RateLimitMiddleware(_ok_app, calls=3, period=60)
+
+    assert [await _request(app) for _ in range(3)] == [200, 200, 200]
+    assert await _request(app) == 429
+
+    # Rejected requests do not consume or delay refills
+    clock.now += 10
+    assert await _request(app) == 429
+    clock.now += 10
+    assert await _request(app) == 200
+    assert await _request(app) == 429
+
+    # A long idle period refills up to the burst size, not beyond it
+    clock.now += 600
+    assert [await _request(app) for _ in range(4)] == [200, 200, 200, 429]
+
+
+@pytest.mark.asyncio
+async def test_buckets_are_per_client(clock):
+    app = RateLimitMiddleware(_ok_app, calls=1, period=60)
+
+    assert await _request(app, "10.0.0.1") == 200
+    assert await _request(app, "10.0.0.1") == 429
+    assert await _request(app, "10.0.0.2") == 200
@@ -0,0 +1,131 @@
+import itertools
+
+import pytest
+
+from py_hrms_auth.rbac import (
+    Permission,
+    Role,
+    can_access_resource,
+    create_access_context,
+    has_all_permissions,
+    has_any_permission,
+    has_permission,
+    invalidate_role,
+)
+
+# Role -> permission codes as granted before permissions became bitmasks
+BASELINE_ROLE_PERMISSIONS = {
+    "employee": {
+        "employee:read", "attendance:read", "attendance:write",
+        "leave:read", "leave:write",
+    },
+    "manager": {
+        "employee:read", "employee:read:all", "attendance:read",
+        "attendance:read:all", "leave:read", "leave:read:all",
+        "leave:approve", "reports:read",
+    },
+    "hr_admin": {
+        "employee:read", "employee:write", "employee:read:all",
+        "attendance:read", "attendance:read:all", "attendance:manage",
+        "leave:read", "leave:read:all", "leave:approve", "leave:manage",
+        "user:read", "user:write", "reports:read", "reports:generate",
+        "workflow:read", "workflow:manage",
+    },
+    "system_admin": {permission.code for permission in Permission},
+    "auditor": {
+        "employee:read", "employee:read:all", "attendance:read",
+        "attendance:read:all", "leave:read", "leave:read:all",
+        "audit:read", "reports:read", "workflow:read",
+    },
+}
+
+ROLE_COMBINATIONS = [
+    *([role.value] for role in Role),
+    *(list(pair) for pair in itertools.combinations([role.value for role in Role], 2)),
+    ["unknown"],
+    ["employee", "unknown"],
+    [],
+]
+
+
+def _baseline_permissions(roles):
+    codes = set()
+    for role in roles:
+        codes |= BASELINE_ROLE_PERMISSIONS.get(role, set())
+    return codes
+
+
+def _baseline_can_access(codes, roles, user_id, department, resource_type, owner_id, resource_department):
+    if "system:admin" in codes:
+        return True
+    if resource_type == "employee":
+        if owner_id == user_id and "employee:read" in codes:
+            return True
+        if "employee:read:all" in codes:
+            return True
+        return (
+            "employee:read" in codes
+            and resource_department == department
+            and "manager" in roles
+        )
+    if resource_type in ("attendance", "leave"):
+        if owner_id == user_id and f"{resource_type}:read" in codes:
+            return True
+        return f"{resource_type}:read:all" in codes
+    return False
+
+
+@pytest.fixture(autouse=True)
+def _fresh_role_masks():
+    invalidate_role()
+    yield
+    invalidate_role()
+
+
+def _context(roles):
+    return create_access_context(
+        {"user_id": 7, "roles": roles, "tenant_id": "acme-corp", "department": "sales"}
+    )
+
+
+@pytest.mark.parametrize("roles", ROLE_COMBINATIONS, ids=lambda roles: "+".join(roles) or "none")
+def test_effective_permissions_match_baseline(roles):
+    context = _context(roles)
+    expected = _baseline_permissions(roles)
+
+    granted = {permission.code for permission in Permission if has_permission(context, permission)}
+    assert granted == expected
+
+    all_permissions = list(Permission)
+    assert has_all_permissions(context, all_permissions) == (expected == BASELINE_ROLE_PERMISSIONS["system_admin"])
+    for permission in all_permissions:
+        assert has_any_permission(context, [permission]) == (permission.code in expected)
+        assert has_all_permissions(context, [permission]) == (permission.code in expected)
+
+
+@pytest.mark.parametrize("roles", ROLE_COMBINATIONS, ids=lambda roles: "+".join(roles) or "none")
+@pytest.mark.parametrize("resource_type", ["employee", "attendance", "leave", "payroll"])
+@pytest.mark.parametrize("owner_id", [7, 8, None])
+@pytest.mark.parametrize("resource_department", ["sales", "finance", None])
+def test_resource_access_matches_baseline(roles, resource_type, owner_id, resource_department):
+    context = _context(roles)
+    expected = _baseline_can_access(
+        _baseline_permissions(roles), roles, 7, "sales",
+        resource_type, owner_id, resource_department,
+    )
+
+    assert can_access_resource(
+        context,
+        resource_type,
+        resource_owner_id=owner_id,
+        resource_department=resource_department,
+    ) == expected
+
+
+@pytest.mark.parametrize("resource_type", ["employee", "attendance", "leave", "payroll", ""])
+def test_system_admin_overrides_every_check(resource_type):
+    context = _context(["system_admin"])
+
+    assert can_access_resource(context, resource_type, resource_owner_id=8, resource_department="finance")
+    assert has_all_permissions(context, list(Permission))
+    assert all(has_permission(context, permission) for permission in Permission)
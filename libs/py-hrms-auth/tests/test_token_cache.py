@@ -0,0 +1,155 @@
+import time
+
+import httpx
+import jwt
+import pytest
+import respx
+from cachetools import TLRUCache
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+
+from py_hrms_auth import jwt_dep
+
+JWKS_URL = "https://idp.example.com/jwks"
+ISSUER = "https://idp.example.com"
+AUDIENCE = "agentichr"
+
+
+class _Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def _signing_key(kid):
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+    jwk.update(kid=kid, alg="RS256", use="sig")
+    return private_key, jwk
+
+
+def _token(private_key, kid, exp, **claims):
+    payload = {
+        "sub": "user-1",
+        "iss": ISSUER,
+        "aud": AUDIENCE,
+        "iat": int(time.time()),
+        "exp": exp,
+        **claims,
+    }
+    return jwt.encode(payload, private_key, algorithm="RS256", headers={"kid": kid})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock(time.time())
+    monkeypatch.setattr(jwt_dep, "ISSUER", ISSUER)
+    monkeypatch.setattr(jwt_dep, "AUDIENCE", AUDIENCE)
+    monkeypatch.setattr(jwt_dep, "JWKS_URL", JWKS_URL)
+    monkeypatch.setattr(
+        jwt_dep, "_token_cache",
+        TLRUCache(maxsize=100, ttu=jwt_dep._token_ttu, timer=clock),
+    )
+    monkeypatch.setattr(
+        jwt_dep, "_jwks_cache",
+        jwt_dep._JwksCache(ttl=600, min_refresh_interval=0),
+    )
+    return clock
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_cache_hit_never_outlives_exp(clock, monkeypatch):
+    monkeypatch.setattr(jwt_dep, "TOKEN_CACHE_TTL", 30)
+    private_key, jwk = _signing_key("k1")
+    jwks_route = respx.get(JWKS_URL).mock(return_value=httpx.Response(200, json={"keys": [jwk]}))
+
+    # Expires well before the cache TTL would
+    exp = int(clock.now) + 10
+    token = _token(private_key, "k1", exp)
+    payload = await jwt_dep.verify_bearer_token(f"Bearer {token}")
+
+    clock.now = exp - 1
+    assert jwt_dep._get_cached_payload(token) == payload
+    assert await jwt_dep.verify_bearer_token(f"Bearer {token}") == payload
+    assert jwks_route.call_count == 1
+
+    clock.now = exp
+    assert jwt_dep._get_cached_payload(token) is None
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_cache_ttl_caps_long_lived_tokens(clock, monkeypatch):
+    monkeypatch.setattr(jwt_dep, "TOKEN_CACHE_TTL", 30)
+    private_key, jwk = _signing_key("k1")
+    respx.get(JWKS_URL).mock(return_value=httpx.Response(200, json={"keys": [jwk]}))
+
+    token = _token(private_key, "k1", int(clock.now) + 3600)
+    await jwt_dep.verify_bearer_token(f"Bearer {token}")
+
+    clock.now += 30
+    assert jwt_dep._get_cached_payload(token) is None
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_tampered_token_misses_cache_and_fails(clock):
+    private_key, jwk = _signing_key("k1")
+    respx.get(JWKS_URL).mock(return_value=httpx.Response(200, json={"keys": [jwk]}))
+
+    token = _token(private_key, "k1", int(clock.now) + 300)
+    await jwt_dep.verify_bearer_token(f"Bearer {token}")
+
+    # Same header and signature, different claims
+    header, _, signature = token.split(".")
+    forged_claims = _token(private_key, "k1", int(clock.now) + 300, roles=["hr.admin"]).split(".")[1]
+    tampered = f"{header}.{forged_claims}.{signature}"
+
+    assert jwt_dep._get_cached_payload(tampered) is None
+    with pytest.raises(HTTPException) as exc_info:
+        await jwt_dep.verify_bearer_token(f"Bearer {tampered}")
+    assert exc_info.value.status_code == 401
+    assert jwt_dep._get_cached_payload(tampered) is None
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_unknown_kid_refreshes_jwks(clock):
+    old_key, old_jwk = _signing_key("k1")
+    new_key, new_jwk = _signing_key("k2")
+    jwks_route = respx.get(JWKS_URL).mock(
+        side_effect=[
+            httpx.Response(200, json={"keys": [old_jwk]}),
+            httpx.Response(200, json={"keys": [old_jwk, new_jwk]}),
+        ]
+    )
+
+    await jwt_dep.verify_bearer_token(f"Bearer {_token(old_key, 'k1', int(clock.now) + 300)}")
+    assert jwks_route.call_count == 1
+
+    # The IdP rotated in k2 after the keys were cached
+    payload = await jwt_dep.verify_bearer_token(f"Bearer {_token(new_key, 'k2', int(clock.now) + 300)}")
+    assert payload.sub == "user-1"
+    assert jwks_route.call_count == 2
+
+
+@pytest.mark.asyncio
+@respx.mock
+async def test_unknown_kid_within_min_refresh_interval_is_rejected(clock, monkeypatch):
+    monkeypatch.setattr(
+        jwt_dep, "_jwks_cache",
+        jwt_dep._JwksCache(ttl=600, min_refresh_interval=30),
+    )
+    old_key, old_jwk = _signing_key("k1")
+    new_key, _ = _signing_key("k2")
+    jwks_route = respx.get(JWKS_URL).mock(return_value=httpx.Response(200, json={"keys": [old_jwk]}))
+
+    await jwt_dep.verify_bearer_token(f"Bearer {_token(old_key, 'k1', int(clock.now) + 300)}")
+    with pytest.raises(HTTPException) as exc_info:
+        await jwt_dep.verify_bearer_token(f"Bearer {_token(new_key, 'k2', int(clock.now) + 300)}")
+
+    assert exc_info.value.status_code == 401
+    assert jwks_route.call_count == 1
@@ -1,74 +1,98 @@
 """AgenticHR Observability Library."""
 
-from .metrics import (
-    MetricsMiddleware,
-    track_db_operation,
-    track_business_operation,
-    track_task_execution,
-    record_auth_attempt,
-    set_active_tokens,
-    set_db_connections,
-    set_service_info,
-    update_uptime,
-    update_memory_usage,
-    get_metrics,
-    get_metrics_content_type,
-)
+import importlib
 
-from .logging import (
-    configure_logging,
-    LoggingMiddleware,
-    PerformanceLogger,
-    log_performance,
-    log_business_event,
-    log_security_event,
-    log_audit_event,
-    log_error,
-    get_logger,
-    set_correlation_id,
-    set_user_context,
-    get_correlation_id,
-    generate_correlation_id,
-    debug, info, warning, error, critical,
-)
+# The submodules pull in heavy dependencies (prometheus_client, OpenTelemetry,
+# SQLAlchemy, httpx, ...), so each name is imported on first access instead of
+# when the package is imported
+_LAZY_IMPORTS = {
+    **dict.fromkeys((
+        "MetricsMiddleware",
+        "track_db_operation",
+        "track_business_operation",
+        "track_task_execution",
+        "record_auth_attempt",
+        "set_active_tokens",
+        "set_db_connections",
+        "set_service_info",
+        "update_uptime",
+        "update_memory_usage",
+        "get_metrics",
+        "get_metrics_content_type",
+    ), "metrics"),
+    **dict.fromkeys((
+        "configure_logging",
+        "configure_audit_logging",
+        "stop_audit_logging",
+        "LoggingMiddleware",
+        "PerformanceLogger",
+        "log_performance",
+        "log_business_event",
+        "log_security_event",
+        "log_audit_event",
+        "log_error",
+        "get_logger",
+        "set_correlation_id",
+        "set_user_context",
+        "get_correlation_id",
+        "generate_correlation_id",
+        "debug", "info", "warning", "error", "critical",
+    ), "logging"),
+    **dict.fromkeys((
+        "configure_tracing",
+        "get_tracer",
+        "create_span",
+        "trace_function",
+        "trace_database_operation",
+        "trace_business_operation",
+        "trace_external_call",
+        "add_span_attribute",
+        "add_span_event",
+        "record_exception",
+        "get_trace_id",
+        "get_span_id",
+        "TracingContext",
+        "create_tracing_context",
+    ), "tracing"),
+    "instrument_db": "instrumentation",
+    "AuditLogORM": "audit_log",
+    "init_audit_db": "db",
+    "create_audit_partitions": "db",
+    "write_audit_rows": "db",
+    "close_audit_writer": "db",
+    "AuditLogMiddleware": "middleware",
+    **dict.fromkeys((
+        "HealthStatus",
+        "HealthCheck",
+        "HealthReport",
+        "HealthChecker",
+        "HealthRouter",
+        "database_health_check",
+        "redis_health_check",
+        "http_service_health_check",
+        "celery_health_check",
+        "close_health_clients",
+        "add_health_endpoints",
+    ), "health"),
+}
 
-from .tracing import (
-    configure_tracing,
-    get_tracer,
-    create_span,
-    trace_function,
-    trace_database_operation,
-    trace_business_operation,
-    trace_external_call,
-    add_span_attribute,
-    add_span_event,
-    record_exception,
-    get_trace_id,
-    get_span_id,
-    TracingContext,
-    create_tracing_context,
-)
+def __getattr__(name):
+    module_name = _LAZY_IMPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
 
-from .audit_log import AuditLogORM
-
-from .db import init_audit_db
-from .middleware import AuditLogMiddleware
-
-from .health import (
-    HealthStatus,
-    HealthCheck,
-    HealthReport,
-    HealthChecker,
-    database_health_check,
-    redis_health_check,
-    http_service_health_check,
-    celery_health_check,
-    add_health_endpoints,
-)
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
 
 __all__ = [
     "AuditLogORM",
     "init_audit_db",
+    "create_audit_partitions",
+    "write_audit_rows",
+    "close_audit_writer",
     "AuditLogMiddleware",
     # Metrics
     "MetricsMiddleware",
@@ -86,6 +110,8 @@ __all__ = [
     
     # Logging
     "configure_logging",
+    "configure_audit_logging",
+    "stop_audit_logging",
     "LoggingMiddleware",
     "PerformanceLogger",
     "log_performance",
@@ -116,15 +142,20 @@ __all__ = [
     "TracingContext",
     "create_tracing_context",
     
+    # Combined instrumentation
+    "instrument_db",
+    
     # Health
     "HealthStatus",
     "HealthCheck",
     "HealthReport",
     "HealthChecker",
+    "HealthRouter",
     "database_health_check",
     "redis_health_check",
     "http_service_health_check",
     "celery_health_check",
+    "close_health_clients",
     "add_health_endpoints",
 ]
 
@@ -1,26 +1,56 @@
-from datetime import datetime
-from typing import Optional, Dict, Any
+from datetime import date
+from typing import Optional, Dict, Any, Tuple
 
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
 
 class AuditLogORM(Base):
     __tablename__ = "audit_logs"
+    __table_args__ = (
+        Index("ix_audit_tenant_user_ts", "tenant_id", "user_id", "timestamp"),
+        Index("ix_audit_details_gin", "details", postgresql_using="gin"),
+        # Monthly range partitions and the default partition are created by
+        # create_audit_partitions
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    # The partition key has to be part of the primary key
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # Writers stamp the timestamp when the event happens; the server default
+    # only covers rows inserted without one
+    timestamp = Column(DateTime, primary_key=True, server_default=func.now())
     user_id = Column(Integer, nullable=True)
     tenant_id = Column(String, nullable=True)
     action = Column(String, nullable=False)
     resource_type = Column(String, nullable=False)
     resource_id = Column(Integer, nullable=True)
     success = Column(Boolean, nullable=False)
-    details = Column(JSON, nullable=True)
+    details = Column(JSONB, nullable=True)
     ip_address = Column(String, nullable=True)
     user_agent = Column(String, nullable=True)
     method = Column(String, nullable=True)
     url = Column(String, nullable=True)
     status_code = Column(Integer, nullable=True)
+    # Number of identical events coalesced into this row
+    count = Column(Integer, nullable=False, server_default="1")
 
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+# Catches rows for months without a partition of their own, so inserts
+# never fail when partition maintenance falls behind
+AUDIT_DEFAULT_PARTITION = f"{AuditLogORM.__tablename__}_default"
+
+def audit_partition_name(month: date) -> str:
+    """Name of the audit_logs partition covering a month"""
+    return f"{AuditLogORM.__tablename__}_{month:%Y_%m}"
+
+def audit_partition_bounds(month: date) -> Tuple[date, date]:
+    """First day of the month and of the following month"""
+    start = month.replace(day=1)
+    return start, _add_months(start, 1)
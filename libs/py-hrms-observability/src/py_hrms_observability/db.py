@@ -1,20 +1,226 @@
 import os
+import asyncio
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import orjson
+import structlog
+from sqlalchemy import insert, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import NullPool
 
-from .audit_log import Base
+from .audit_log import (
+    AUDIT_DEFAULT_PARTITION,
+    AuditLogORM,
+    Base,
+    _add_months,
+    audit_partition_bounds,
+    audit_partition_name,
+)
 
 AUDIT_DATABASE_URL = os.getenv("AUDIT_DATABASE_URL", "postgresql+asyncpg://hr:hr@postgres:5432/hr")
 
-engine = create_async_engine(AUDIT_DATABASE_URL, poolclass=NullPool)
+AUDIT_POOL_SIZE = int(os.getenv("AUDIT_POOL_SIZE", "10"))
+AUDIT_MAX_OVERFLOW = int(os.getenv("AUDIT_MAX_OVERFLOW", "20"))
+# Set when AUDIT_DATABASE_URL points at pgbouncer in transaction pooling mode,
+# which does its own pooling and does not tolerate long-lived client sessions
+AUDIT_DB_PGBOUNCER = os.getenv("AUDIT_DB_PGBOUNCER", "false").lower() in ("1", "true", "yes")
+
+# Audit rows queued for the background writer, and the most written per INSERT
+AUDIT_WRITE_QUEUE_SIZE = int(os.getenv("AUDIT_WRITE_QUEUE_SIZE", "10000"))
+AUDIT_WRITE_BATCH_SIZE = int(os.getenv("AUDIT_WRITE_BATCH_SIZE", "500"))
+# Seconds between the writer's checks that upcoming monthly partitions exist
+AUDIT_PARTITION_CHECK_INTERVAL = float(os.getenv("AUDIT_PARTITION_CHECK_INTERVAL", "3600"))
+
+logger = structlog.get_logger(__name__)
+
+def _json_serializer(value: Any) -> str:
+    # The audit details column is written on every request; orjson encodes
+    # it several times faster than the stdlib json default
+    return orjson.dumps(value).decode()
+
+if AUDIT_DB_PGBOUNCER:
+    engine = create_async_engine(
+        AUDIT_DATABASE_URL,
+        poolclass=NullPool,
+        json_serializer=_json_serializer,
+        json_deserializer=orjson.loads,
+    )
+else:
+    engine = create_async_engine(
+        AUDIT_DATABASE_URL,
+        json_serializer=_json_serializer,
+        json_deserializer=orjson.loads,
+        pool_size=AUDIT_POOL_SIZE,
+        max_overflow=AUDIT_MAX_OVERFLOW,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+    )
 AsyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
 
 async def init_audit_db():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    await create_audit_partitions()
+
+# Advisory lock serializing partition maintenance between the services
+# that share the audit_logs table
+_PARTITION_LOCK_ID = 0x61756469746C6F67
+
+async def create_audit_partitions(months_ahead: int = 1) -> bool:
+    """Create the audit_logs partitions for this month and the next ones.
+
+    Also creates the DEFAULT partition, which takes rows for months that have
+    no partition yet. AuditLogWriter calls this every
+    AUDIT_PARTITION_CHECK_INTERVAL seconds. Returns False when audit_logs is
+    not a partitioned table, e.g. before the audit migration has been run.
+    """
+    if engine.dialect.name != "postgresql":
+        return False
+    table = AuditLogORM.__tablename__
+    this_month = date.today().replace(day=1)
+    async with engine.begin() as conn:
+        relkind = await conn.scalar(
+            text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass(:table)"),
+            {"table": table},
+        )
+        if relkind != "p":
+            if relkind is not None:
+                logger.warning(
+                    "audit_logs_not_partitioned",
+                    hint="run the py_hrms_observability audit migration",
+                )
+            return False
+        
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": _PARTITION_LOCK_ID})
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {AUDIT_DEFAULT_PARTITION} PARTITION OF {table} DEFAULT"
+        ))
+        for offset in range(months_ahead + 1):
+            await _create_month_partition(conn, _add_months(this_month, offset))
+    return True
+
+async def _create_month_partition(conn, month: date):
+    name = audit_partition_name(month)
+    if await conn.scalar(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}):
+        return
+    table = AuditLogORM.__tablename__
+    start, end = audit_partition_bounds(month)
+    # The default partition may already hold rows for this month, which
+    # would make a plain PARTITION OF fail; build the table detached, move
+    # those rows into it and attach it afterwards
+    await conn.execute(text(
+        f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+    ))
+    await conn.execute(text(
+        f"WITH moved AS ("
+        f"DELETE FROM {AUDIT_DEFAULT_PARTITION} "
+        f"WHERE \"timestamp\" >= '{start.isoformat()}' AND \"timestamp\" < '{end.isoformat()}' "
+        f"RETURNING *"
+        f") INSERT INTO {name} SELECT * FROM moved"
+    ))
+    await conn.execute(text(
+        f"ALTER TABLE {table} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    logger.info("audit_partition_created", partition=name)
 
 async def get_audit_db():
     async with AsyncSessionLocal() as session:
         yield session
 
+
+# Built once and executed on a plain connection, so batches go straight to
+# a Core executemany without the ORM session's bulk insert handling
+_AUDIT_INSERT = insert(AuditLogORM.__table__)
+
+async def write_audit_rows(rows: List[Dict[str, Any]]):
+    """Insert audit rows with a single executemany INSERT
+    
+    The rows are column-name dicts and must all have the same keys.
+    """
+    if not rows:
+        return
+    async with engine.begin() as conn:
+        await conn.execute(_AUDIT_INSERT, rows)
+
+class AuditLogWriter:
+    """Writes queued audit rows to the database in batches
+    
+    Rows are queued without waiting for the database and a background task
+    inserts whatever has accumulated since its last write, so requests do not
+    pay for an INSERT and COMMIT each. When the queue is full rows are dropped
+    and counted rather than slowing requests down.
+    """
+    
+    def __init__(self, max_queue_size: int = AUDIT_WRITE_QUEUE_SIZE, batch_size: int = AUDIT_WRITE_BATCH_SIZE):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+    
+    def enqueue(self, row: Dict[str, Any]) -> bool:
+        """Queue an audit row for writing; returns False if it was dropped"""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            # Started on first use so the queue and task belong to the
+            # running event loop
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._task = loop.create_task(self._run())
+        
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        return True
+    
+    async def _run(self):
+        queue = self._queue
+        loop = asyncio.get_running_loop()
+        next_partition_check = loop.time()
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            
+            # Long-running processes keep creating next month's partition
+            if loop.time() >= next_partition_check:
+                next_partition_check = loop.time() + AUDIT_PARTITION_CHECK_INTERVAL
+                try:
+                    await create_audit_partitions()
+                except Exception as e:
+                    logger.error("audit_partition_maintenance_failed", error=str(e))
+            
+            try:
+                await write_audit_rows(batch)
+            except Exception as e:
+                logger.error("audit_write_failed", rows=len(batch), error=str(e))
+            finally:
+                for _ in batch:
+                    queue.task_done()
+    
+    async def close(self):
+        """Write the rows still queued and stop the background task"""
+        if self._task is None:
+            return
+        if not self._task.done():
+            await self._queue.join()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        self._queue = None
+        if self.dropped:
+            logger.warning("audit_rows_dropped", dropped=self.dropped)
+            self.dropped = 0
+
+audit_writer = AuditLogWriter()
+
+async def close_audit_writer():
+    """Flush queued audit rows; call on service shutdown"""
+    await audit_writer.close()
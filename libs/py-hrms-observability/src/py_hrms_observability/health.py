@@ -9,13 +9,28 @@ This module provides comprehensive health checking including:
 """
 import time
 import asyncio
-from typing import Dict, Any, List, Optional, Callable, Awaitable
+import hashlib
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Mapping, Tuple
 from enum import Enum
-from dataclasses import dataclass, asdict
-from fastapi import FastAPI, Response, status
+from dataclasses import dataclass
+from fastapi import APIRouter, FastAPI, Request, Response, status
 import httpx
+import orjson
 import psutil
 
+# Database and Redis drivers are optional; their checks report UNKNOWN when
+# the driver is not installed
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
 class HealthStatus(Enum):
     """Health check status"""
     HEALTHY = "healthy"
@@ -23,6 +38,17 @@ class HealthStatus(Enum):
     DEGRADED = "degraded"
     UNKNOWN = "unknown"
 
+# Precedence of check statuses when aggregating them into an overall status
+_STATUS_SEVERITY = {
+    HealthStatus.HEALTHY: 0,
+    HealthStatus.UNKNOWN: 1,
+    HealthStatus.DEGRADED: 2,
+    HealthStatus.UNHEALTHY: 3,
+}
+
+# Reports are serialised by orjson straight from these dataclasses and their
+# HealthStatus members. They are deliberately not slotted: orjson reads a
+# regular dataclass's __dict__ directly and is about twice as fast on it.
 @dataclass
 class HealthCheck:
     """Individual health check result"""
@@ -44,26 +70,66 @@ class HealthReport:
     checks: List[HealthCheck]
     system_info: Optional[Dict[str, Any]] = None
 
+def _exc_to_details(e: BaseException) -> Dict[str, Any]:
+    """Describe a failed check's exception for HealthCheck details"""
+    return {"error": str(e), "error_type": type(e).__name__}
+
 class HealthChecker:
     """Health checker for services"""
     
-    def __init__(self, service_name: str, service_version: str = "0.1.0"):
+    def __init__(
+        self,
+        service_name: str,
+        service_version: str = "0.1.0",
+        cache_ttl: float = 2.0,
+        default_timeout: float = 5.0,
+        system_info_interval: float = 5.0
+    ):
         self.service_name = service_name
         self.service_version = service_version
+        self.default_timeout = default_timeout
         self.start_time = time.time()
         self.checks: Dict[str, Callable[[], Awaitable[HealthCheck]]] = {}
+        # Immutable copy of checks iterated by reports, rebuilt on registration
+        self._snapshot: Tuple[Tuple[str, Callable[[], Awaitable[HealthCheck]]], ...] = ()
+        
+        # Probes and /health/detailed poll constantly; reports are reused for
+        # cache_ttl seconds, separately with and without system info
+        self.cache_ttl = cache_ttl
+        self._report_cache: Dict[bool, Tuple[float, HealthReport]] = {}
+        self._report_locks = {True: asyncio.Lock(), False: asyncio.Lock()}
+        
+        # System info is sampled in the background and served from the last
+        # sample rather than measured on each request
+        self.system_info_interval = system_info_interval
+        self._system_info: Dict[str, Any] = {}
+        self._system_info_task: Optional[asyncio.Task] = None
     
     def add_check(self, name: str, check_func: Callable[[], Awaitable[HealthCheck]]):
         """Add a health check"""
-        self.checks[name] = check_func
+        self.add_checks({name: check_func})
+    
+    def add_checks(self, checks: Mapping[str, Callable[[], Awaitable[HealthCheck]]]):
+        """Add several health checks at once"""
+        self.checks.update(checks)
+        self._snapshot = tuple(self.checks.items())
+        # Cached reports do not include the new checks
+        self._report_cache.clear()
     
-    async def run_check(self, name: str, check_func: Callable) -> HealthCheck:
+    async def run_check(
+        self,
+        name: str,
+        check_func: Callable,
+        timeout: Optional[float] = None
+    ) -> HealthCheck:
         """Run a single health check"""
-        start_time = time.time()
+        if timeout is None:
+            timeout = self.default_timeout
+        start_time = time.perf_counter()
         
         try:
-            result = await check_func()
-            duration = (time.time() - start_time) * 1000
+            result = await asyncio.wait_for(check_func(), timeout)
+            duration = (time.perf_counter() - start_time) * 1000
             
             if isinstance(result, HealthCheck):
                 result.duration_ms = duration
@@ -80,25 +146,65 @@ class HealthChecker:
                     timestamp=time.time()
                 )
         
+        except asyncio.TimeoutError:
+            return HealthCheck(
+                name=name,
+                status=HealthStatus.UNHEALTHY,
+                message=f"Check timed out after {timeout}s",
+                duration_ms=(time.perf_counter() - start_time) * 1000,
+                timestamp=time.time()
+            )
+        
         except Exception as e:
-            duration = (time.time() - start_time) * 1000
+            duration = (time.perf_counter() - start_time) * 1000
+            details = _exc_to_details(e)
             return HealthCheck(
                 name=name,
                 status=HealthStatus.UNHEALTHY,
-                message=f"Check failed: {str(e)}",
+                message=f"Check failed: {details['error']}",
                 duration_ms=duration,
                 timestamp=time.time(),
-                details={"error": str(e), "error_type": type(e).__name__}
+                details=details
             )
     
-    async def get_health_report(self, include_system_info: bool = True) -> HealthReport:
-        """Get comprehensive health report"""
-        check_results = []
+    async def get_health_report(
+        self,
+        include_system_info: bool = True,
+        force_refresh: bool = False
+    ) -> HealthReport:
+        """Get comprehensive health report, reusing a recent one if available"""
+        include_system_info = bool(include_system_info)
         
-        # Run all health checks
-        for name, check_func in self.checks.items():
-            result = await self.run_check(name, check_func)
-            check_results.append(result)
+        if not force_refresh:
+            cached = self._cached_report(include_system_info)
+            if cached is not None:
+                return cached
+        
+        # Concurrent callers wait for a single evaluation instead of each
+        # running every check
+        async with self._report_locks[include_system_info]:
+            if not force_refresh:
+                cached = self._cached_report(include_system_info)
+                if cached is not None:
+                    return cached
+            
+            report = await self._build_health_report(include_system_info)
+            self._report_cache[include_system_info] = (time.perf_counter(), report)
+            return report
+    
+    def _cached_report(self, include_system_info: bool) -> Optional[HealthReport]:
+        cached = self._report_cache.get(include_system_info)
+        if cached is not None and time.perf_counter() - cached[0] < self.cache_ttl:
+            return cached[1]
+        return None
+    
+    async def _build_health_report(self, include_system_info: bool) -> HealthReport:
+        """Run all checks and build a fresh health report"""
+        # Run all health checks concurrently; run_check turns failures and
+        # timeouts into unhealthy results, so total time is the slowest check
+        check_results = list(await asyncio.gather(
+            *(self.run_check(name, check_func) for name, check_func in self._snapshot)
+        ))
         
         # Determine overall status
         overall_status = self._determine_overall_status(check_results)
@@ -106,7 +212,7 @@ class HealthChecker:
         # Get system info if requested
         system_info = None
         if include_system_info:
-            system_info = self._get_system_info()
+            system_info = await self._get_system_info()
         
         return HealthReport(
             status=overall_status,
@@ -120,25 +226,41 @@ class HealthChecker:
     
     def _determine_overall_status(self, checks: List[HealthCheck]) -> HealthStatus:
         """Determine overall health status from individual checks"""
-        if not checks:
-            return HealthStatus.HEALTHY
-        
-        statuses = [check.status for check in checks]
-        
-        if HealthStatus.UNHEALTHY in statuses:
-            return HealthStatus.UNHEALTHY
-        elif HealthStatus.DEGRADED in statuses:
-            return HealthStatus.DEGRADED
-        elif HealthStatus.UNKNOWN in statuses:
-            return HealthStatus.UNKNOWN
-        else:
-            return HealthStatus.HEALTHY
+        # Single pass keeping the most severe status; nothing outranks unhealthy
+        overall = HealthStatus.HEALTHY
+        overall_severity = 0
+        for check in checks:
+            severity = _STATUS_SEVERITY[check.status]
+            if severity > overall_severity:
+                overall = check.status
+                overall_severity = severity
+                if overall is HealthStatus.UNHEALTHY:
+                    break
+        return overall
     
-    def _get_system_info(self) -> Dict[str, Any]:
-        """Get system information"""
+    async def _get_system_info(self) -> Dict[str, Any]:
+        """Get system information from the latest background sample"""
+        if self._system_info_task is None or self._system_info_task.done():
+            loop = asyncio.get_running_loop()
+            self._system_info_task = loop.create_task(self._sample_system_info_periodically())
+            self._system_info = await loop.run_in_executor(None, self._first_system_info_sample)
+        return dict(self._system_info)
+    
+    def _first_system_info_sample(self) -> Dict[str, Any]:
+        # Prime the CPU counters; non-blocking cpu_percent reports usage
+        # since the previous call
+        psutil.cpu_percent(interval=None)
+        return self._sample_system_info()
+    
+    def _sample_system_info(self) -> Dict[str, Any]:
+        """Take a system information sample
+        
+        psutil reads /proc and stats the filesystem, so this runs in the
+        default executor rather than on the event loop.
+        """
         try:
             return {
-                "cpu_percent": psutil.cpu_percent(interval=1),
+                "cpu_percent": psutil.cpu_percent(interval=None),
                 "memory_percent": psutil.virtual_memory().percent,
                 "disk_percent": psutil.disk_usage('/').percent,
                 "load_average": psutil.getloadavg() if hasattr(psutil, 'getloadavg') else None,
@@ -146,6 +268,85 @@ class HealthChecker:
             }
         except Exception:
             return {"error": "Could not retrieve system info"}
+    
+    async def _sample_system_info_periodically(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.system_info_interval)
+            self._system_info = await loop.run_in_executor(None, self._sample_system_info)
+    
+    async def close(self):
+        """Stop background sampling"""
+        if self._system_info_task is not None:
+            self._system_info_task.cancel()
+            try:
+                await self._system_info_task
+            except asyncio.CancelledError:
+                pass
+            self._system_info_task = None
+
+# Clients shared by the dependency checks below, so each probe reuses open
+# connections instead of paying a new handshake
+_http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Get the HTTP client shared by HTTP service health checks"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_keepalive_connections=100, keepalive_expiry=60)
+        )
+    return _http_client
+
+# Small dedicated pools, kept apart from the application's own pool so a
+# saturated main pool does not make the service report itself unhealthy
+_db_pools: Dict[str, Any] = {}
+_db_pools_lock = asyncio.Lock()
+
+async def _get_db_pool(database_url: str):
+    """Get the health check connection pool for a database URL"""
+    pool = _db_pools.get(database_url)
+    if pool is None:
+        async with _db_pools_lock:
+            pool = _db_pools.get(database_url)
+            if pool is None:
+                pool = await asyncpg.create_pool(database_url, min_size=1, max_size=2)
+                _db_pools[database_url] = pool
+    return pool
+
+_redis_clients: Dict[str, Any] = {}
+
+def _get_redis_client(redis_url: str):
+    """Get the health check Redis client for a URL"""
+    client = _redis_clients.get(redis_url)
+    if client is None:
+        # Creating the client does no I/O, so no lock is needed; the client
+        # pools its own connections
+        client = redis_asyncio.from_url(
+            redis_url,
+            max_connections=4,
+            socket_keepalive=True,
+            health_check_interval=30,
+        )
+        _redis_clients[redis_url] = client
+    return client
+
+async def close_health_clients():
+    """Close the clients shared by the health checks"""
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    
+    pools = list(_db_pools.values())
+    _db_pools.clear()
+    for pool in pools:
+        await pool.close()
+    
+    clients = list(_redis_clients.values())
+    _redis_clients.clear()
+    for client in clients:
+        await client.aclose()
 
 # Common health check functions
 
@@ -154,21 +355,27 @@ async def database_health_check(
     timeout: float = 5.0
 ) -> HealthCheck:
     """Check database connectivity"""
+    if asyncpg is None:
+        return HealthCheck(
+            name="database",
+            status=HealthStatus.UNKNOWN,
+            message="asyncpg is not installed",
+            duration_ms=0,
+            timestamp=time.time()
+        )
+    
     try:
-        # This is a simplified check - in production you'd use actual DB connection
-        import asyncpg
+        start_time = time.perf_counter()
         
-        start_time = time.time()
-        conn = await asyncio.wait_for(
-            asyncpg.connect(database_url),
-            timeout=timeout
-        )
+        async def ping():
+            pool = await _get_db_pool(database_url)
+            async with pool.acquire() as conn:
+                # Simple query to test connection
+                await conn.fetchval("SELECT 1")
         
-        # Simple query to test connection
-        await conn.fetchval("SELECT 1")
-        await conn.close()
+        await asyncio.wait_for(ping(), timeout=timeout)
         
-        duration = (time.time() - start_time) * 1000
+        duration = (time.perf_counter() - start_time) * 1000
         
         return HealthCheck(
             name="database",
@@ -188,13 +395,14 @@ async def database_health_check(
         )
     
     except Exception as e:
+        details = _exc_to_details(e)
         return HealthCheck(
             name="database",
             status=HealthStatus.UNHEALTHY,
-            message=f"Database connection failed: {str(e)}",
+            message=f"Database connection failed: {details['error']}",
             duration_ms=0,
             timestamp=time.time(),
-            details={"error": str(e)}
+            details=details
         )
 
 async def redis_health_check(
@@ -202,17 +410,23 @@ async def redis_health_check(
     timeout: float = 5.0
 ) -> HealthCheck:
     """Check Redis connectivity"""
+    if redis_asyncio is None:
+        return HealthCheck(
+            name="redis",
+            status=HealthStatus.UNKNOWN,
+            message="redis is not installed",
+            duration_ms=0,
+            timestamp=time.time()
+        )
+    
     try:
-        import redis.asyncio as redis
-        
-        start_time = time.time()
-        client = redis.from_url(redis_url)
+        start_time = time.perf_counter()
+        client = _get_redis_client(redis_url)
         
         # Simple ping to test connection
         await asyncio.wait_for(client.ping(), timeout=timeout)
-        await client.close()
         
-        duration = (time.time() - start_time) * 1000
+        duration = (time.perf_counter() - start_time) * 1000
         
         return HealthCheck(
             name="redis",
@@ -232,13 +446,14 @@ async def redis_health_check(
         )
     
     except Exception as e:
+        details = _exc_to_details(e)
         return HealthCheck(
             name="redis",
             status=HealthStatus.UNHEALTHY,
-            message=f"Redis connection failed: {str(e)}",
+            message=f"Redis connection failed: {details['error']}",
             duration_ms=0,
             timestamp=time.time(),
-            details={"error": str(e)}
+            details=details
         )
 
 async def http_service_health_check(
@@ -249,12 +464,11 @@ async def http_service_health_check(
 ) -> HealthCheck:
     """Check HTTP service health"""
     try:
-        start_time = time.time()
+        start_time = time.perf_counter()
         
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.get(url)
+        response = await get_http_client().get(url, timeout=timeout)
         
-        duration = (time.time() - start_time) * 1000
+        duration = (time.perf_counter() - start_time) * 1000
         
         if response.status_code == expected_status:
             return HealthCheck(
@@ -275,7 +489,7 @@ async def http_service_health_check(
                 details={"status_code": response.status_code, "expected": expected_status}
             )
     
-    except asyncio.TimeoutError:
+    except (asyncio.TimeoutError, httpx.TimeoutException):
         return HealthCheck(
             name=service_name,
             status=HealthStatus.UNHEALTHY,
@@ -285,13 +499,14 @@ async def http_service_health_check(
         )
     
     except Exception as e:
+        details = _exc_to_details(e)
         return HealthCheck(
             name=service_name,
             status=HealthStatus.UNHEALTHY,
-            message=f"Service check failed: {str(e)}",
+            message=f"Service check failed: {details['error']}",
             duration_ms=0,
             timestamp=time.time(),
-            details={"error": str(e)}
+            details=details
         )
 
 async def celery_health_check(
@@ -322,32 +537,72 @@ async def celery_health_check(
             )
     
     except Exception as e:
+        details = _exc_to_details(e)
         return HealthCheck(
             name="celery_broker",
             status=HealthStatus.UNHEALTHY,
-            message=f"Celery broker check failed: {str(e)}",
+            message=f"Celery broker check failed: {details['error']}",
             duration_ms=0,
             timestamp=time.time(),
-            details={"error": str(e)}
+            details=details
         )
 
-def add_health_endpoints(app: FastAPI, health_checker: HealthChecker):
-    """Add health check endpoints to FastAPI app"""
+_NOT_READY_BODY = orjson.dumps({"status": "not_ready"})
+# Probe responses must not be served from intermediary caches
+_NO_CACHE_HEADERS = {"Cache-Control": "no-cache, no-store, must-revalidate"}
+# The detailed report may be stored, but only to be revalidated with its ETag
+_REVALIDATE_CACHE_CONTROL = "no-cache, must-revalidate"
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header value against an ETag"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+class HealthRouter:
+    """Router serving the health endpoints for a HealthChecker"""
     
-    @app.get("/health")
-    async def health():
-        """Basic health check"""
-        return {
+    def __init__(self, health_checker: HealthChecker):
+        self.health_checker = health_checker
+        self.start_time = health_checker.start_time
+        self._time = time.time
+        # Serialised body and ETag of the last detailed report, reused while
+        # the checker keeps returning the same cached report
+        self._detailed: Optional[Tuple[HealthReport, bytes, str]] = None
+        
+        # The basic and liveness bodies only vary in their time fields, so the
+        # rest is serialised once and the numbers are appended per request
+        self._health_prefix = orjson.dumps({
             "status": "healthy",
             "service": health_checker.service_name,
             "version": health_checker.service_version,
-            "timestamp": time.time()
-        }
+        })[:-1] + b',"timestamp":'
+        self._live_prefix = orjson.dumps({
+            "status": "alive",
+            "service": health_checker.service_name,
+        })[:-1] + b',"uptime_seconds":'
+        
+        self.router = APIRouter()
+        self.router.add_api_route("/health", self.health, methods=["GET"])
+        self.router.add_api_route("/health/detailed", self.detailed_health, methods=["GET"])
+        self.router.add_api_route("/health/ready", self.readiness, methods=["GET"])
+        self.router.add_api_route("/health/live", self.liveness, methods=["GET"])
     
-    @app.get("/health/detailed")
-    async def detailed_health():
+    async def health(self):
+        """Basic health check"""
+        return Response(
+            content=self._health_prefix + f"{self._time()!r}}}".encode(),
+            media_type="application/json",
+            headers=_NO_CACHE_HEADERS
+        )
+    
+    async def detailed_health(self, request: Request):
         """Detailed health check with all dependencies"""
-        report = await health_checker.get_health_report()
+        report = await self.health_checker.get_health_report()
         
         # Set HTTP status based on health
         status_code = status.HTTP_200_OK
@@ -356,33 +611,73 @@ def add_health_endpoints(app: FastAPI, health_checker: HealthChecker):
         elif report.status == HealthStatus.DEGRADED:
             status_code = status.HTTP_200_OK  # Still serving traffic
         
+        detailed = self._detailed
+        if detailed is None or detailed[0] is not report:
+            # orjson serialises the dataclasses and enums directly, without
+            # building an intermediate dict
+            body = orjson.dumps(report)
+            etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+            detailed = self._detailed = (report, body, etag)
+        _, body, etag = detailed
+        
+        headers = {"Cache-Control": _REVALIDATE_CACHE_CONTROL, "ETag": etag}
+        
+        # Pollers that already hold this report skip the body; failures are
+        # always sent in full so the 503 is not masked
+        if status_code == status.HTTP_200_OK and _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        
         return Response(
-            content=str(asdict(report)),
+            content=body,
             status_code=status_code,
-            media_type="application/json"
+            media_type="application/json",
+            headers=headers
         )
     
-    @app.get("/health/ready")
-    async def readiness():
+    async def readiness(self):
         """Readiness probe - is service ready to serve traffic?"""
-        report = await health_checker.get_health_report(include_system_info=False)
+        report = await self.health_checker.get_health_report(include_system_info=False)
         
         if report.status in [HealthStatus.HEALTHY, HealthStatus.DEGRADED]:
-            return {"status": "ready", "timestamp": time.time()}
+            return Response(
+                content=orjson.dumps({"status": "ready", "timestamp": self._time()}),
+                media_type="application/json",
+                headers=_NO_CACHE_HEADERS
+            )
         else:
             return Response(
-                content='{"status": "not_ready"}',
+                content=_NOT_READY_BODY,
                 status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-                media_type="application/json"
+                media_type="application/json",
+                headers=_NO_CACHE_HEADERS
             )
     
-    @app.get("/health/live")
-    async def liveness():
+    async def liveness(self):
         """Liveness probe - is service alive?"""
         # Simple liveness check - if we can respond, we're alive
-        return {
-            "status": "alive",
-            "service": health_checker.service_name,
-            "uptime_seconds": time.time() - health_checker.start_time,
-            "timestamp": time.time()
-        }
+        now = self._time()
+        return Response(
+            content=self._live_prefix + f'{now - self.start_time!r},"timestamp":{now!r}}}'.encode(),
+            media_type="application/json",
+            headers=_NO_CACHE_HEADERS
+        )
+
+def add_health_endpoints(app: FastAPI, health_checker: HealthChecker):
+    """Add health check endpoints to FastAPI app"""
+    
+    # Close the shared clients on shutdown. The lifespan is wrapped so this
+    # also works for apps created with lifespan=..., where shutdown event
+    # handlers are not run.
+    app_lifespan = app.router.lifespan_context
+    
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        try:
+            async with app_lifespan(app) as state:
+                yield state
+        finally:
+            await health_checker.close()
+            await close_health_clients()
+    
+    app.router.lifespan_context = lifespan
+    app.include_router(HealthRouter(health_checker).router)
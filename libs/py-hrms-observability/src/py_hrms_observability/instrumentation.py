@@ -0,0 +1,112 @@
+"""
+Combined tracing and metrics instrumentation for AgenticHR services
+
+This module provides decorators that do the work of a tracing decorator and
+a metrics decorator in a single wrapper, for hot paths such as database calls.
+"""
+import time
+from functools import wraps
+from typing import Dict, Optional
+
+from opentelemetry import trace
+from prometheus_client import Counter
+
+from . import tracing
+from .metrics import db_operations_total, db_operation_duration_seconds, errors_total
+
+def instrument_db(
+    operation: str,
+    table: str,
+    service_name: str,
+    query: Optional[str] = None
+):
+    """Decorator to trace and record metrics for database operations
+
+    Equivalent to stacking trace_database_operation and track_db_operation,
+    but each call goes through one wrapper and one timer.
+    """
+    span_name = f"db.{operation}"
+
+    # Label children are resolved once per decorated operation
+    operations = db_operations_total.labels(
+        operation=operation,
+        table=table,
+        service=service_name
+    )
+    durations = db_operation_duration_seconds.labels(
+        operation=operation,
+        table=table,
+        service=service_name
+    )
+    error_counters: Dict[str, Counter] = {}
+
+    def record_error(e: Exception):
+        error_type = f"db_{type(e).__name__}"
+        counter = error_counters.get(error_type)
+        if counter is None:
+            counter = error_counters[error_type] = errors_total.labels(
+                error_type=error_type,
+                service=service_name
+            )
+        counter.inc()
+
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            if not tracing._TRACING_ENABLED:
+                start_time = time.perf_counter()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    record_error(e)
+                    raise
+
+                durations.observe(time.perf_counter() - start_time)
+                operations.inc()
+                return result
+
+            with tracing._TRACER.start_as_current_span(
+                span_name,
+                kind=trace.SpanKind.CLIENT
+            ) as span:
+                # Sampled-out spans drop attributes and status anyway
+                recording = span.is_recording()
+
+                if recording:
+                    # Add database attributes
+                    span.set_attribute("db.operation", operation)
+                    span.set_attribute("db.table", table)
+                    span.set_attribute("db.system", "postgresql")
+
+                    if query:
+                        span.set_attribute("db.statement", query)
+
+                start_time = time.perf_counter()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    record_error(e)
+                    if recording:
+                        span.set_status(
+                            trace.Status(
+                                trace.StatusCode.ERROR,
+                                description=str(e)
+                            )
+                        )
+                        span.record_exception(e)
+                    raise
+
+                durations.observe(time.perf_counter() - start_time)
+                operations.inc()
+
+                if recording:
+                    span.set_status(trace.Status(trace.StatusCode.OK))
+
+                    # Add result info if available
+                    if hasattr(result, 'rowcount'):
+                        span.set_attribute("db.rows_affected", result.rowcount)
+
+                return result
+
+        return wrapper
+    return decorator
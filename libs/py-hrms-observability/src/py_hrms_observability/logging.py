@@ -11,19 +11,30 @@ This module provides standardized structured logging with:
 import os
 import sys
 import time
-import uuid
+import secrets
+import inspect
+import functools
+import queue
+import atexit
 import logging
+import orjson
 import structlog
+from logging.handlers import QueueHandler, QueueListener
 from typing import Dict, Any, Optional
 from contextvars import ContextVar
 from fastapi import Request
-from fastapi.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 # Context variables for request tracking
 correlation_id_var: ContextVar[Optional[str]] = ContextVar('correlation_id', default=None)
 user_id_var: ContextVar[Optional[str]] = ContextVar('user_id', default=None)
 tenant_id_var: ContextVar[Optional[str]] = ContextVar('tenant_id', default=None)
 
+# Shared logger for the module-level helpers; structlog resolves the
+# configuration on first use, so this is safe to create at import time
+_LOG: structlog.BoundLogger = structlog.get_logger()
+
 def configure_logging(
     service_name: str,
     log_level: str = "INFO",
@@ -31,33 +42,45 @@ def configure_logging(
     include_stdlib: bool = True
 ):
     """Configure structured logging for the service"""
+    global _LOG
     
     # Configure structlog
     processors = [
-        structlog.contextvars.merge_contextvars,
         structlog.processors.add_log_level,
         structlog.processors.TimeStamper(fmt="iso"),
         add_service_context(service_name),
-        add_correlation_id,
-        add_user_context,
+        add_request_context,
     ]
     
     if json_logs:
-        processors.append(structlog.processors.JSONRenderer())
+        # Tracebacks requested with exc_info become a string field; the
+        # console renderer formats them itself
+        processors.append(structlog.processors.format_exc_info)
+        # orjson renders bytes, which BytesLogger writes without re-encoding;
+        # it handles datetime, UUID and Enum values natively
+        processors.append(structlog.processors.JSONRenderer(
+            serializer=orjson.dumps,
+            option=orjson.OPT_NON_STR_KEYS,
+        ))
+        logger_factory = structlog.BytesLoggerFactory()
     else:
         processors.extend([
             structlog.dev.ConsoleRenderer(colors=True),
         ])
+        logger_factory = structlog.WriteLoggerFactory()
     
     structlog.configure(
         processors=processors,
         wrapper_class=structlog.make_filtering_bound_logger(
             getattr(logging, log_level.upper())
         ),
-        logger_factory=structlog.WriteLoggerFactory(),
+        logger_factory=logger_factory,
         cache_logger_on_first_use=True,
     )
     
+    # A logger used before this call would keep the old configuration cached
+    _LOG = structlog.get_logger()
+    
     # Configure standard library logging if requested
     if include_stdlib:
         logging.basicConfig(
@@ -69,6 +92,59 @@ def configure_logging(
         # Reduce noise from some libraries
         logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
         logging.getLogger("httpx").setLevel(logging.WARNING)
+        
+        configure_audit_logging(logging.getLogger().handlers)
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+    
+    def __init__(self, queue_: queue.Queue):
+        super().__init__(queue_)
+        self.dropped = 0
+    
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class _AuditQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # The queue is bounded, so wait for room rather than failing on stop
+        self.queue.put(self._sentinel)
+
+_audit_listener: Optional[QueueListener] = None
+
+def configure_audit_logging(handlers, max_queue_size: int = 10_000) -> DroppingQueueHandler:
+    """Route the audit logger through a queue drained by a listener thread
+    
+    The audit logger only gets a non-blocking queue handler; the given
+    handlers do the actual output from the listener thread.
+    """
+    global _audit_listener
+    
+    stop_audit_logging()
+    
+    audit_queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+    queue_handler = DroppingQueueHandler(audit_queue)
+    
+    audit_logger = logging.getLogger("agentichr.audit")
+    audit_logger.handlers = [queue_handler]
+    audit_logger.propagate = False
+    
+    _audit_listener = _AuditQueueListener(audit_queue, *handlers, respect_handler_level=True)
+    _audit_listener.start()
+    
+    return queue_handler
+
+@atexit.register
+def stop_audit_logging():
+    """Flush queued audit records and stop the listener thread"""
+    global _audit_listener
+    
+    if _audit_listener is not None:
+        _audit_listener.stop()
+        _audit_listener = None
 
 def add_service_context(service_name: str):
     """Add service context to all log entries"""
@@ -78,20 +154,17 @@ def add_service_context(service_name: str):
         return event_dict
     return processor
 
-def add_correlation_id(logger, method_name, event_dict):
-    """Add correlation ID to log entries"""
+def add_request_context(logger, method_name, event_dict):
+    """Add correlation ID and user context to log entries"""
     correlation_id = correlation_id_var.get()
     if correlation_id:
         event_dict["correlation_id"] = correlation_id
-    return event_dict
-
-def add_user_context(logger, method_name, event_dict):
-    """Add user context to log entries"""
-    user_id = user_id_var.get()
-    tenant_id = tenant_id_var.get()
     
+    user_id = user_id_var.get()
     if user_id:
         event_dict["user_id"] = user_id
+    
+    tenant_id = tenant_id_var.get()
     if tenant_id:
         event_dict["tenant_id"] = tenant_id
     
@@ -113,18 +186,28 @@ def get_correlation_id() -> Optional[str]:
     return correlation_id_var.get()
 
 def generate_correlation_id() -> str:
-    """Generate a new correlation ID"""
-    return str(uuid.uuid4())
+    """Generate a new correlation ID (32 random hex characters)"""
+    return secrets.token_hex(16)
+
+# Request headers included in request logs; others (e.g. authorization,
+# cookie) are never logged
+_LOGGED_REQUEST_HEADERS = ("user-agent", "content-length")
 
-class LoggingMiddleware(BaseHTTPMiddleware):
+class LoggingMiddleware:
     """Middleware to add request logging and correlation IDs"""
     
-    def __init__(self, app, service_name: str):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, service_name: str):
+        self.app = app
         self.service_name = service_name
-        self.logger = structlog.get_logger()
+        self.logger = _LOG
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        request = Request(scope)
+        
         # Generate or extract correlation ID
         correlation_id = (
             request.headers.get("x-correlation-id") or
@@ -141,50 +224,60 @@ class LoggingMiddleware(BaseHTTPMiddleware):
             # For now, we'll just log that auth is present
             pass
         
-        start_time = time.time()
+        start_time = time.perf_counter()
         
-        # Log request start
-        self.logger.info(
-            "request_started",
-            method=request.method,
-            url=str(request.url),
-            path=request.url.path,
-            query_params=dict(request.query_params),
-            headers=dict(request.headers),
-            client_ip=request.client.host if request.client else None,
-        )
-        
-        try:
-            # Add correlation ID to response headers
-            response = await call_next(request)
-            response.headers["x-correlation-id"] = correlation_id
-            
-            # Log successful request
-            duration = time.time() - start_time
-            self.logger.info(
-                "request_completed",
+        # Log request start; the arguments are only built when DEBUG is enabled
+        if self.logger.is_enabled_for(logging.DEBUG):
+            self.logger.debug(
+                "request_started",
                 method=request.method,
                 path=request.url.path,
-                status_code=response.status_code,
-                duration_ms=round(duration * 1000, 2),
-                response_size=response.headers.get("content-length"),
+                query_params=dict(request.query_params),
+                headers={
+                    name: request.headers[name]
+                    for name in _LOGGED_REQUEST_HEADERS
+                    if name in request.headers
+                },
+                client_ip=request.client.host if request.client else None,
             )
-            
-            return response
-            
+        
+        status_code = None
+        response_size = None
+        
+        async def send_with_correlation_id(message: Message):
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                # Add correlation ID to response headers
+                headers = MutableHeaders(scope=message)
+                headers["x-correlation-id"] = correlation_id
+                status_code = message["status"]
+                response_size = headers.get("content-length")
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_correlation_id)
         except Exception as e:
             # Log error
-            duration = time.time() - start_time
             self.logger.error(
                 "request_failed",
                 method=request.method,
                 path=request.url.path,
-                duration_ms=round(duration * 1000, 2),
+                duration_ms=round((time.perf_counter() - start_time) * 1000, 2),
                 error_type=type(e).__name__,
                 error_message=str(e),
-                exc_info=True,
             )
+            # The server logs the traceback of the re-raised exception
             raise
+        
+        # Log successful request
+        self.logger.info(
+            "request_completed",
+            method=request.method,
+            path=request.url.path,
+            status_code=status_code,
+            duration_ms=round((time.perf_counter() - start_time) * 1000, 2),
+            response_size=response_size,
+        )
 
 class PerformanceLogger:
     """Context manager for performance logging"""
@@ -192,11 +285,11 @@ class PerformanceLogger:
     def __init__(self, operation: str, **context):
         self.operation = operation
         self.context = context
-        self.logger = structlog.get_logger()
+        self.logger = _LOG
         self.start_time = None
     
     def __enter__(self):
-        self.start_time = time.time()
+        self.start_time = time.perf_counter()
         self.logger.debug(
             "operation_started",
             operation=self.operation,
@@ -205,20 +298,20 @@ class PerformanceLogger:
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        duration = time.time() - self.start_time
+        duration_ms = round((time.perf_counter() - self.start_time) * 1000, 2)
         
         if exc_type is None:
             self.logger.info(
                 "operation_completed",
                 operation=self.operation,
-                duration_ms=round(duration * 1000, 2),
+                duration_ms=duration_ms,
                 **self.context
             )
         else:
             self.logger.error(
                 "operation_failed",
                 operation=self.operation,
-                duration_ms=round(duration * 1000, 2),
+                duration_ms=duration_ms,
                 error_type=exc_type.__name__,
                 error_message=str(exc_val),
                 **self.context
@@ -227,25 +320,26 @@ class PerformanceLogger:
 def log_performance(operation: str, **context):
     """Decorator for performance logging"""
     def decorator(func):
-        async def async_wrapper(*args, **kwargs):
-            with PerformanceLogger(operation, **context):
-                return await func(*args, **kwargs)
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with PerformanceLogger(operation, **context):
+                    return await func(*args, **kwargs)
+            
+            return async_wrapper
         
+        @functools.wraps(func)
         def sync_wrapper(*args, **kwargs):
             with PerformanceLogger(operation, **context):
                 return func(*args, **kwargs)
         
-        if hasattr(func, '__code__') and 'async' in func.__code__.co_flags:
-            return async_wrapper
-        else:
-            return sync_wrapper
+        return sync_wrapper
     
     return decorator
 
 def log_business_event(event: str, **data):
     """Log business events for analytics"""
-    logger = structlog.get_logger()
-    logger.info(
+    _LOG.info(
         "business_event",
         event=event,
         **data
@@ -253,9 +347,7 @@ def log_business_event(event: str, **data):
 
 def log_security_event(event: str, severity: str = "info", **data):
     """Log security events"""
-    logger = structlog.get_logger()
-    
-    log_method = getattr(logger, severity.lower(), logger.info)
+    log_method = getattr(_LOG, severity.lower(), _LOG.info)
     log_method(
         "security_event",
         event=event,
@@ -265,8 +357,7 @@ def log_security_event(event: str, severity: str = "info", **data):
 
 def log_audit_event(action: str, resource: str, **data):
     """Log audit events"""
-    logger = structlog.get_logger()
-    logger.info(
+    _LOG.info(
         "audit_event",
         action=action,
         resource=resource,
@@ -276,41 +367,36 @@ def log_audit_event(action: str, resource: str, **data):
 
 def log_error(error: Exception, context: Optional[Dict[str, Any]] = None):
     """Log errors with context"""
-    logger = structlog.get_logger()
-    logger.error(
+    _LOG.error(
         "error_occurred",
         error_type=type(error).__name__,
         error_message=str(error),
         context=context or {},
-        exc_info=True
+        # Format the given error's traceback, also outside an except block
+        exc_info=error
     )
 
 def get_logger(name: Optional[str] = None) -> structlog.BoundLogger:
     """Get a structured logger instance"""
-    return structlog.get_logger(name)
+    return structlog.get_logger(name) if name else _LOG
 
 # Convenience functions for common log levels
 def debug(message: str, **kwargs):
     """Log debug message"""
-    logger = structlog.get_logger()
-    logger.debug(message, **kwargs)
+    _LOG.debug(message, **kwargs)
 
 def info(message: str, **kwargs):
     """Log info message"""
-    logger = structlog.get_logger()
-    logger.info(message, **kwargs)
+    _LOG.info(message, **kwargs)
 
 def warning(message: str, **kwargs):
     """Log warning message"""
-    logger = structlog.get_logger()
-    logger.warning(message, **kwargs)
+    _LOG.warning(message, **kwargs)
 
 def error(message: str, **kwargs):
     """Log error message"""
-    logger = structlog.get_logger()
-    logger.error(message, **kwargs)
+    _LOG.error(message, **kwargs)
 
 def critical(message: str, **kwargs):
     """Log critical message"""
-    logger = structlog.get_logger()
-    logger.critical(message, **kwargs)
+    _LOG.critical(message, **kwargs)
@@ -7,20 +7,40 @@ This module provides standardized metrics collection for all services including:
 - Business logic metrics
 - System health metrics
 """
+import os
+import re
 import time
-from typing import Dict, Any, Optional
-from functools import wraps
+from typing import Dict, Any, Optional, Tuple
+from functools import lru_cache, wraps
 from prometheus_client import (
     Counter, Histogram, Gauge, Info,
     CollectorRegistry, generate_latest,
     CONTENT_TYPE_LATEST
 )
 from fastapi import Request, Response
-from fastapi.middleware.base import BaseHTTPMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 # Create custom registry for service metrics
 service_registry = CollectorRegistry()
 
+def _buckets_from_env(name: str, default: Tuple[float, ...]) -> Tuple[float, ...]:
+    """Histogram buckets from a comma-separated env var, or the default"""
+    value = os.getenv(name)
+    if not value:
+        return default
+    return tuple(float(bucket) for bucket in value.split(","))
+
+# Histogram buckets (seconds) sized to each workload's typical latencies
+HTTP_BUCKETS = _buckets_from_env(
+    "HTTP_LATENCY_BUCKETS", (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+)
+DB_BUCKETS = _buckets_from_env(
+    "DB_LATENCY_BUCKETS", (.0005, .001, .005, .01, .05, .1, .5, 1, 5)
+)
+TASK_BUCKETS = _buckets_from_env(
+    "TASK_LATENCY_BUCKETS", (.1, .5, 1, 5, 10, 30, 60, 300, 600, 1800)
+)
+
 # HTTP Metrics
 http_requests_total = Counter(
     'http_requests_total',
@@ -33,6 +53,7 @@ http_request_duration_seconds = Histogram(
     'http_request_duration_seconds',
     'HTTP request duration in seconds',
     ['method', 'endpoint', 'service'],
+    buckets=HTTP_BUCKETS,
     registry=service_registry
 )
 
@@ -55,6 +76,7 @@ db_operation_duration_seconds = Histogram(
     'db_operation_duration_seconds',
     'Database operation duration in seconds',
     ['operation', 'table', 'service'],
+    buckets=DB_BUCKETS,
     registry=service_registry
 )
 
@@ -77,6 +99,7 @@ business_operation_duration_seconds = Histogram(
     'business_operation_duration_seconds',
     'Business operation duration in seconds',
     ['operation', 'service'],
+    buckets=HTTP_BUCKETS,
     registry=service_registry
 )
 
@@ -107,6 +130,7 @@ task_duration_seconds = Histogram(
     'task_duration_seconds',
     'Task execution duration in seconds',
     ['task_name', 'service'],
+    buckets=TASK_BUCKETS,
     registry=service_registry
 )
 
@@ -146,89 +170,119 @@ errors_total = Counter(
     registry=service_registry
 )
 
-class MetricsMiddleware(BaseHTTPMiddleware):
+class MetricsMiddleware:
     """Middleware to collect HTTP metrics"""
     
-    def __init__(self, app, service_name: str):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, service_name: str):
+        self.app = app
         self.service_name = service_name
+        
+        # Labelled children are cached so the per-request path does a dict
+        # lookup instead of resolving labels in prometheus_client
+        self._in_progress = http_requests_in_progress.labels(service=service_name)
+        self._requests_total: Dict[Tuple[str, str, Any], Counter] = {}
+        self._request_duration: Dict[Tuple[str, str], Histogram] = {}
+        self._errors_total: Dict[str, Counter] = {}
     
-    async def dispatch(self, request: Request, call_next):
-        # Skip metrics endpoint itself
-        if request.url.path == "/metrics":
-            return await call_next(request)
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        # Skip non-HTTP traffic and the metrics endpoint itself
+        if scope["type"] != "http" or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+        
+        request = Request(scope)
         
         # Track request in progress
-        http_requests_in_progress.labels(service=self.service_name).inc()
+        self._in_progress.inc()
         
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
+        status_code = None
+        
+        async def send_with_status(message: Message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
         
         try:
-            response = await call_next(request)
-            
-            # Record metrics
-            duration = time.time() - start_time
-            
-            http_requests_total.labels(
-                method=request.method,
-                endpoint=self._get_endpoint_pattern(request),
-                status_code=response.status_code,
-                service=self.service_name
-            ).inc()
-            
-            http_request_duration_seconds.labels(
-                method=request.method,
-                endpoint=self._get_endpoint_pattern(request),
-                service=self.service_name
-            ).observe(duration)
-            
-            return response
+            await self.app(scope, receive, send_with_status)
             
         except Exception as e:
             # Record error
-            errors_total.labels(
-                error_type=type(e).__name__,
-                service=self.service_name
-            ).inc()
-            
-            # Still record the request
-            duration = time.time() - start_time
-            http_request_duration_seconds.labels(
-                method=request.method,
-                endpoint=self._get_endpoint_pattern(request),
-                service=self.service_name
-            ).observe(duration)
-            
+            error_type = type(e).__name__
+            errors = self._errors_total.get(error_type)
+            if errors is None:
+                errors = self._errors_total[error_type] = errors_total.labels(
+                    error_type=error_type,
+                    service=self.service_name
+                )
+            errors.inc()
             raise
         
         finally:
+            # Record metrics; the duration is recorded for failed requests too
+            duration = (time.perf_counter_ns() - start_ns) / 1e9
+            
+            method = request.method
+            endpoint = self._get_endpoint_pattern(request)
+            
+            # Requests are counted once a response status was sent
+            if status_code is not None:
+                key = (method, endpoint, status_code)
+                requests_total = self._requests_total.get(key)
+                if requests_total is None:
+                    requests_total = self._requests_total[key] = http_requests_total.labels(
+                        method=method,
+                        endpoint=endpoint,
+                        status_code=status_code,
+                        service=self.service_name
+                    )
+                requests_total.inc()
+            
+            duration_key = (method, endpoint)
+            request_duration = self._request_duration.get(duration_key)
+            if request_duration is None:
+                request_duration = self._request_duration[duration_key] = http_request_duration_seconds.labels(
+                    method=method,
+                    endpoint=endpoint,
+                    service=self.service_name
+                )
+            request_duration.observe(duration)
+            
             # Decrement in-progress counter
-            http_requests_in_progress.labels(service=self.service_name).dec()
+            self._in_progress.dec()
     
     def _get_endpoint_pattern(self, request: Request) -> str:
         """Extract endpoint pattern from request"""
-        # This is a simplified version - in production you'd want to
-        # extract the actual route pattern from FastAPI
-        path = request.url.path
-        
-        # Replace IDs with placeholders
-        import re
-        path = re.sub(r'/\d+', '/{id}', path)
+        # The router stores the matched route in the scope; its path template
+        # keeps label cardinality bounded by the number of routes
+        route = request.scope.get("route")
+        route_path = getattr(route, "path", None)
+        if route_path:
+            return route_path
         
-        return path
+        # No route matched (e.g. 404s); fall back to masking numeric IDs
+        return _mask_path_ids(request.scope["path"])
+
+_ID_RE = re.compile(r'/\d+')
+
+@lru_cache(maxsize=1024)
+def _mask_path_ids(path: str) -> str:
+    """Replace numeric path segments with an {id} placeholder"""
+    return _ID_RE.sub('/{id}', path)
 
 def track_db_operation(operation: str, table: str, service_name: str):
     """Decorator to track database operations"""
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            start_time = time.time()
+            start_time = time.perf_counter()
             
             try:
                 result = await func(*args, **kwargs)
                 
                 # Record successful operation
-                duration = time.time() - start_time
+                duration = time.perf_counter() - start_time
                 db_operations_total.labels(
                     operation=operation,
                     table=table,
@@ -259,13 +313,13 @@ def track_business_operation(operation: str, service_name: str):
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            start_time = time.time()
+            start_time = time.perf_counter()
             
             try:
                 result = await func(*args, **kwargs)
                 
                 # Record successful operation
-                duration = time.time() - start_time
+                duration = time.perf_counter() - start_time
                 business_operations_total.labels(
                     operation=operation,
                     service=service_name
@@ -300,13 +354,13 @@ def track_task_execution(task_name: str, service_name: str):
                 service=service_name
             ).inc()
             
-            start_time = time.time()
+            start_time = time.perf_counter()
             
             try:
                 result = func(*args, **kwargs)
                 
                 # Record successful task
-                duration = time.time() - start_time
+                duration = time.perf_counter() - start_time
                 tasks_total.labels(
                     task_name=task_name,
                     status="success",
@@ -377,9 +431,26 @@ def update_memory_usage(memory_bytes: int, service_name: str):
     """Update memory usage"""
     memory_usage_bytes.labels(service=service_name).set(memory_bytes)
 
-def get_metrics() -> str:
-    """Get metrics in Prometheus format"""
-    return generate_latest(service_registry).decode('utf-8')
+# Rendered exposition shared by scrapes within METRICS_CACHE_TTL seconds
+METRICS_CACHE_TTL = float(os.getenv("METRICS_CACHE_TTL", "1.0"))
+_metrics_cache: Tuple[float, bytes] = (0.0, b"")
+
+def get_metrics() -> bytes:
+    """Get metrics in Prometheus format
+    
+    Rendering walks every labelled child, so the output is reused for
+    METRICS_CACHE_TTL seconds when several scrapers poll the same process.
+    """
+    global _metrics_cache
+    
+    now = time.monotonic()
+    rendered_at, payload = _metrics_cache
+    if payload and now - rendered_at < METRICS_CACHE_TTL:
+        return payload
+    
+    payload = generate_latest(service_registry)
+    _metrics_cache = (now, payload)
+    return payload
 
 def get_metrics_content_type() -> str:
     """Get metrics content type"""
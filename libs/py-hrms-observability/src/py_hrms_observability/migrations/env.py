@@ -0,0 +1,49 @@
+import asyncio
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import create_async_engine
+import os
+
+from py_hrms_observability.audit_log import Base  # metadata
+
+config = context.config
+if config.config_file_name:
+    fileConfig(config.config_file_name)
+
+def get_url():
+    return os.getenv("AUDIT_DATABASE_URL", config.get_main_option("sqlalchemy.url"))
+
+target_metadata = Base.metadata
+version_table = config.get_main_option("version_table", "audit_alembic_version")
+
+async def run_migrations_online():
+    connectable = create_async_engine(get_url(), poolclass=pool.NullPool)
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await connectable.dispose()
+
+def do_run_migrations(connection: Connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        version_table=version_table,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_offline():
+    context.configure(
+        url=get_url(),
+        target_metadata=target_metadata,
+        version_table=version_table,
+        literal_binds=True,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
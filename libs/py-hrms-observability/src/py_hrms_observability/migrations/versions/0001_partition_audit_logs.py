@@ -0,0 +1,145 @@
+"""Partition audit_logs by month
+
+Revision ID: audit_0001
+Revises:
+Create Date: 2026-10-16 21:00:00.000000
+
+Converts an audit_logs table created before partitioning (single-column
+primary key, JSON details, no count column) into one RANGE partitioned on
+timestamp, with a DEFAULT partition and partitions for this and next month.
+Existing rows are copied in the same transaction, so expect the upgrade to
+take a while on large tables. Databases where audit_logs is already
+partitioned, or does not exist yet, are left to init_audit_db.
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = "audit_0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Columns present in both table layouts
+COPIED_COLUMNS = (
+    "id, user_id, tenant_id, action, resource_type, resource_id, success, "
+    "ip_address, user_agent, method, url, status_code"
+)
+
+def _relkind():
+    return op.get_bind().scalar(
+        sa.text("SELECT relkind::text FROM pg_class WHERE oid = to_regclass('audit_logs')")
+    )
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def upgrade() -> None:
+    if _relkind() != "r":
+        return
+
+    # Keep the old table, and its id sequence, until the rows are copied
+    op.rename_table("audit_logs", "audit_logs_unpartitioned")
+    op.execute(
+        "ALTER TABLE audit_logs_unpartitioned "
+        "RENAME CONSTRAINT audit_logs_pkey TO audit_logs_unpartitioned_pkey"
+    )
+    op.execute("DROP INDEX IF EXISTS ix_audit_logs_id")
+
+    op.create_table(
+        "audit_logs",
+        sa.Column(
+            "id", sa.Integer(), nullable=False,
+            server_default=sa.text("nextval('audit_logs_id_seq'::regclass)")
+        ),
+        sa.Column("timestamp", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("tenant_id", sa.String(), nullable=True),
+        sa.Column("action", sa.String(), nullable=False),
+        sa.Column("resource_type", sa.String(), nullable=False),
+        sa.Column("resource_id", sa.Integer(), nullable=True),
+        sa.Column("success", sa.Boolean(), nullable=False),
+        sa.Column("details", postgresql.JSONB(), nullable=True),
+        sa.Column("ip_address", sa.String(), nullable=True),
+        sa.Column("user_agent", sa.String(), nullable=True),
+        sa.Column("method", sa.String(), nullable=True),
+        sa.Column("url", sa.String(), nullable=True),
+        sa.Column("status_code", sa.Integer(), nullable=True),
+        sa.Column("count", sa.Integer(), nullable=False, server_default="1"),
+        sa.PrimaryKeyConstraint("id", "timestamp"),
+        postgresql_partition_by="RANGE (timestamp)",
+    )
+    op.create_index(
+        "ix_audit_tenant_user_ts", "audit_logs", ["tenant_id", "user_id", "timestamp"]
+    )
+    op.create_index(
+        "ix_audit_details_gin", "audit_logs", ["details"], postgresql_using="gin"
+    )
+    op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id")
+
+    op.execute("CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT")
+    this_month = date.today().replace(day=1)
+    for offset in range(2):
+        start = _add_months(this_month, offset)
+        end = _add_months(start, 1)
+        op.execute(
+            f"CREATE TABLE audit_logs_{start:%Y_%m} PARTITION OF audit_logs "
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+
+    # timestamp is part of the new primary key; rows written without one
+    # are kept at the epoch so they stay recognisable
+    op.execute(
+        f"INSERT INTO audit_logs ({COPIED_COLUMNS}, \"timestamp\", details) "
+        f"SELECT {COPIED_COLUMNS}, COALESCE(\"timestamp\", 'epoch'::timestamp), details::jsonb "
+        f"FROM audit_logs_unpartitioned"
+    )
+    op.drop_table("audit_logs_unpartitioned")
+
+def downgrade() -> None:
+    # Coalesced rows keep a single entry; their count is not preserved
+    if _relkind() != "p":
+        return
+
+    op.rename_table("audit_logs", "audit_logs_partitioned")
+    op.execute(
+        "ALTER TABLE audit_logs_partitioned "
+        "RENAME CONSTRAINT audit_logs_pkey TO audit_logs_partitioned_pkey"
+    )
+    op.execute("ALTER INDEX ix_audit_tenant_user_ts RENAME TO ix_audit_partitioned_tenant_user_ts")
+    op.execute("ALTER INDEX ix_audit_details_gin RENAME TO ix_audit_partitioned_details_gin")
+
+    op.create_table(
+        "audit_logs",
+        sa.Column(
+            "id", sa.Integer(), nullable=False,
+            server_default=sa.text("nextval('audit_logs_id_seq'::regclass)")
+        ),
+        sa.Column("timestamp", sa.DateTime(), nullable=True),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("tenant_id", sa.String(), nullable=True),
+        sa.Column("action", sa.String(), nullable=False),
+        sa.Column("resource_type", sa.String(), nullable=False),
+        sa.Column("resource_id", sa.Integer(), nullable=True),
+        sa.Column("success", sa.Boolean(), nullable=False),
+        sa.Column("details", sa.JSON(), nullable=True),
+        sa.Column("ip_address", sa.String(), nullable=True),
+        sa.Column("user_agent", sa.String(), nullable=True),
+        sa.Column("method", sa.String(), nullable=True),
+        sa.Column("url", sa.String(), nullable=True),
+        sa.Column("status_code", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_audit_logs_id", "audit_logs", ["id"])
+    op.execute("ALTER SEQUENCE audit_logs_id_seq OWNED BY audit_logs.id")
+
+    op.execute(
+        f"INSERT INTO audit_logs ({COPIED_COLUMNS}, \"timestamp\", details) "
+        f"SELECT {COPIED_COLUMNS}, \"timestamp\", details::json "
+        f"FROM audit_logs_partitioned"
+    )
+    # Drops the partitions with it
+    op.drop_table("audit_logs_partitioned")
@@ -8,24 +8,85 @@ This module provides OpenTelemetry-based distributed tracing with:
 - Performance monitoring
 """
 import os
+import inspect
+import functools
+import warnings
 from typing import Dict, Any, Optional
+import structlog
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
 from opentelemetry.sdk.trace.export import BatchSpanProcessor
-from opentelemetry.exporter.jaeger.thrift import JaegerExporter
-from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
-from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
+from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
 from opentelemetry.sdk.resources import Resource
 from opentelemetry.semconv.resource import ResourceAttributes
 
+logger = structlog.get_logger(__name__)
+
+# Span export settings, read once at import. The batch settings use the
+# standard OTEL_BSP_* variables with defaults sized for busy services.
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT")
+BSP_MAX_QUEUE_SIZE = int(os.getenv("OTEL_BSP_MAX_QUEUE_SIZE", "4096"))
+BSP_MAX_EXPORT_BATCH_SIZE = int(os.getenv("OTEL_BSP_MAX_EXPORT_BATCH_SIZE", "512"))
+BSP_SCHEDULE_DELAY_MILLIS = int(os.getenv("OTEL_BSP_SCHEDULE_DELAY", "5000"))
+
+# Resolved once; before configure_tracing runs this is a proxy that switches
+# to the configured provider's tracer when one is set
+_TRACER = trace.get_tracer(__name__)
+
+# Set by configure_tracing; until then the decorators and span helpers skip
+# span handling entirely instead of going through the no-op tracer
+_TRACING_ENABLED = False
+
+# The tracer provider can only be set once per process, and instrumenting
+# libraries again would wrap them twice
+_INSTRUMENTED = False
+
 def configure_tracing(
     service_name: str,
     service_version: str = "0.1.0",
-    jaeger_endpoint: Optional[str] = None,
-    sample_rate: float = 1.0
+    otlp_endpoint: Optional[str] = None,
+    sample_rate: float = 1.0,
+    jaeger_endpoint: Optional[str] = None
 ):
-    """Configure OpenTelemetry tracing for the service"""
+    """Configure OpenTelemetry tracing for the service
+    
+    Spans are exported over OTLP/gRPC to ``otlp_endpoint``, or to
+    OTEL_EXPORTER_OTLP_ENDPOINT (e.g. ``http://otel-collector:4317``) when it
+    is not given; with neither set, spans are recorded but not exported.
+    
+    ``jaeger_endpoint`` and the JAEGER_ENDPOINT variable are deprecated. A
+    Jaeger host given either way is used as the OTLP endpoint on port 4317,
+    which Jaeger accepts natively; JAEGER_PORT (the agent's UDP port) is
+    ignored.
+    
+    Only the first successful call in a process has an effect.
+    """
+    global _TRACING_ENABLED, _INSTRUMENTED
+    
+    if _INSTRUMENTED:
+        return
+    
+    if jaeger_endpoint:
+        warnings.warn(
+            "configure_tracing(jaeger_endpoint=...) is deprecated; pass "
+            "otlp_endpoint or set OTEL_EXPORTER_OTLP_ENDPOINT instead",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+    jaeger_host = jaeger_endpoint or os.getenv("JAEGER_ENDPOINT")
+    if os.getenv("JAEGER_ENDPOINT") or os.getenv("JAEGER_PORT"):
+        logger.warning(
+            "jaeger_settings_deprecated",
+            jaeger_endpoint=os.getenv("JAEGER_ENDPOINT"),
+            jaeger_port=os.getenv("JAEGER_PORT"),
+            hint="set OTEL_EXPORTER_OTLP_ENDPOINT instead"
+        )
+    
+    # The exporter and instrumentations import a lot of modules, so they are
+    # only imported by processes that enable tracing
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+    from opentelemetry.instrumentation.sqlalchemy import SQLAlchemyInstrumentor
+    from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
     
     # Create resource with service information
     resource = Resource.create({
@@ -35,26 +96,42 @@ def configure_tracing(
         ResourceAttributes.DEPLOYMENT_ENVIRONMENT: os.getenv("ENVIRONMENT", "development"),
     })
     
-    # Create tracer provider
-    tracer_provider = TracerProvider(resource=resource)
+    # Create tracer provider; root spans are sampled at sample_rate and child
+    # spans follow their parent's decision, so traces stay complete
+    tracer_provider = TracerProvider(
+        resource=resource,
+        sampler=ParentBased(TraceIdRatioBased(sample_rate)),
+    )
     
-    # Configure Jaeger exporter if endpoint provided
-    if jaeger_endpoint or os.getenv("JAEGER_ENDPOINT"):
-        jaeger_exporter = JaegerExporter(
-            agent_host_name=jaeger_endpoint or os.getenv("JAEGER_ENDPOINT", "localhost"),
-            agent_port=int(os.getenv("JAEGER_PORT", "6831")),
-        )
+    # Configure OTLP exporter if endpoint provided
+    endpoint = otlp_endpoint or OTLP_ENDPOINT
+    if not endpoint and jaeger_host:
+        endpoint = f"http://{jaeger_host}:4317"
+    if endpoint:
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        
+        otlp_exporter = OTLPSpanExporter(endpoint=endpoint)
         
-        span_processor = BatchSpanProcessor(jaeger_exporter)
+        span_processor = BatchSpanProcessor(
+            otlp_exporter,
+            max_queue_size=BSP_MAX_QUEUE_SIZE,
+            max_export_batch_size=BSP_MAX_EXPORT_BATCH_SIZE,
+            schedule_delay_millis=BSP_SCHEDULE_DELAY_MILLIS,
+        )
         tracer_provider.add_span_processor(span_processor)
     
     # Set the global tracer provider
     trace.set_tracer_provider(tracer_provider)
+    _TRACING_ENABLED = True
     
     # Auto-instrument common libraries
-    FastAPIInstrumentor.instrument()
-    SQLAlchemyInstrumentor.instrument()
-    HTTPXClientInstrumentor.instrument()
+    FastAPIInstrumentor().instrument()
+    SQLAlchemyInstrumentor().instrument()
+    HTTPXClientInstrumentor().instrument()
+    
+    # Only now, so a call that failed part-way (e.g. a missing
+    # instrumentation package) can be retried
+    _INSTRUMENTED = True
 
 def get_tracer(name: str) -> trace.Tracer:
     """Get a tracer instance"""
@@ -66,8 +143,7 @@ def create_span(
     attributes: Optional[Dict[str, Any]] = None
 ) -> trace.Span:
     """Create a new span"""
-    tracer = trace.get_tracer(__name__)
-    span = tracer.start_span(name, kind=kind)
+    span = _TRACER.start_span(name, kind=kind)
     
     if attributes:
         for key, value in attributes.items():
@@ -84,35 +160,53 @@ def trace_function(
     def decorator(func):
         span_name = name or f"{func.__module__}.{func.__name__}"
         
-        async def async_wrapper(*args, **kwargs):
-            tracer = trace.get_tracer(__name__)
-            with tracer.start_as_current_span(span_name, kind=kind) as span:
-                # Add attributes
-                if attributes:
-                    for key, value in attributes.items():
-                        span.set_attribute(key, value)
-                
-                # Add function info
-                span.set_attribute("function.name", func.__name__)
-                span.set_attribute("function.module", func.__module__)
+        # Pick the wrapper once, when the function is decorated
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _TRACING_ENABLED:
+                    return await func(*args, **kwargs)
                 
-                try:
-                    result = await func(*args, **kwargs)
-                    span.set_status(trace.Status(trace.StatusCode.OK))
-                    return result
-                except Exception as e:
-                    span.set_status(
-                        trace.Status(
-                            trace.StatusCode.ERROR,
-                            description=str(e)
+                with _TRACER.start_as_current_span(span_name, kind=kind) as span:
+                    # Sampled-out spans drop attributes and status anyway
+                    if not span.is_recording():
+                        return await func(*args, **kwargs)
+                    
+                    # Add attributes
+                    if attributes:
+                        for key, value in attributes.items():
+                            span.set_attribute(key, value)
+                    
+                    # Add function info
+                    span.set_attribute("function.name", func.__name__)
+                    span.set_attribute("function.module", func.__module__)
+                    
+                    try:
+                        result = await func(*args, **kwargs)
+                        span.set_status(trace.Status(trace.StatusCode.OK))
+                        return result
+                    except Exception as e:
+                        span.set_status(
+                            trace.Status(
+                                trace.StatusCode.ERROR,
+                                description=str(e)
+                            )
                         )
-                    )
-                    span.record_exception(e)
-                    raise
+                        span.record_exception(e)
+                        raise
+            
+            return async_wrapper
         
+        @functools.wraps(func)
         def sync_wrapper(*args, **kwargs):
-            tracer = trace.get_tracer(__name__)
-            with tracer.start_as_current_span(span_name, kind=kind) as span:
+            if not _TRACING_ENABLED:
+                return func(*args, **kwargs)
+            
+            with _TRACER.start_as_current_span(span_name, kind=kind) as span:
+                # Sampled-out spans drop attributes and status anyway
+                if not span.is_recording():
+                    return func(*args, **kwargs)
+                
                 # Add attributes
                 if attributes:
                     for key, value in attributes.items():
@@ -136,11 +230,7 @@ def trace_function(
                     span.record_exception(e)
                     raise
         
-        # Return appropriate wrapper based on function type
-        if hasattr(func, '__code__') and func.__code__.co_flags & 0x80:  # CO_COROUTINE
-            return async_wrapper
-        else:
-            return sync_wrapper
+        return sync_wrapper
     
     return decorator
 
@@ -151,45 +241,63 @@ def trace_database_operation(
 ):
     """Decorator to trace database operations"""
     def decorator(func):
-        async def async_wrapper(*args, **kwargs):
-            tracer = trace.get_tracer(__name__)
-            with tracer.start_as_current_span(
-                f"db.{operation}",
-                kind=trace.SpanKind.CLIENT
-            ) as span:
-                # Add database attributes
-                span.set_attribute("db.operation", operation)
-                span.set_attribute("db.table", table)
-                span.set_attribute("db.system", "postgresql")
+        # Pick the wrapper once, when the function is decorated
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _TRACING_ENABLED:
+                    return await func(*args, **kwargs)
                 
-                if query:
-                    span.set_attribute("db.statement", query)
-                
-                try:
-                    result = await func(*args, **kwargs)
-                    span.set_status(trace.Status(trace.StatusCode.OK))
+                with _TRACER.start_as_current_span(
+                    f"db.{operation}",
+                    kind=trace.SpanKind.CLIENT
+                ) as span:
+                    # Sampled-out spans drop attributes and status anyway
+                    if not span.is_recording():
+                        return await func(*args, **kwargs)
                     
-                    # Add result info if available
-                    if hasattr(result, 'rowcount'):
-                        span.set_attribute("db.rows_affected", result.rowcount)
+                    # Add database attributes
+                    span.set_attribute("db.operation", operation)
+                    span.set_attribute("db.table", table)
+                    span.set_attribute("db.system", "postgresql")
                     
-                    return result
-                except Exception as e:
-                    span.set_status(
-                        trace.Status(
-                            trace.StatusCode.ERROR,
-                            description=str(e)
+                    if query:
+                        span.set_attribute("db.statement", query)
+                    
+                    try:
+                        result = await func(*args, **kwargs)
+                        span.set_status(trace.Status(trace.StatusCode.OK))
+                        
+                        # Add result info if available
+                        if hasattr(result, 'rowcount'):
+                            span.set_attribute("db.rows_affected", result.rowcount)
+                        
+                        return result
+                    except Exception as e:
+                        span.set_status(
+                            trace.Status(
+                                trace.StatusCode.ERROR,
+                                description=str(e)
+                            )
                         )
-                    )
-                    span.record_exception(e)
-                    raise
+                        span.record_exception(e)
+                        raise
+            
+            return async_wrapper
         
+        @functools.wraps(func)
         def sync_wrapper(*args, **kwargs):
-            tracer = trace.get_tracer(__name__)
-            with tracer.start_as_current_span(
+            if not _TRACING_ENABLED:
+                return func(*args, **kwargs)
+            
+            with _TRACER.start_as_current_span(
                 f"db.{operation}",
                 kind=trace.SpanKind.CLIENT
             ) as span:
+                # Sampled-out spans drop attributes and status anyway
+                if not span.is_recording():
+                    return func(*args, **kwargs)
+                
                 # Add database attributes
                 span.set_attribute("db.operation", operation)
                 span.set_attribute("db.table", table)
@@ -217,11 +325,7 @@ def trace_database_operation(
                     span.record_exception(e)
                     raise
         
-        # Return appropriate wrapper based on function type
-        if hasattr(func, '__code__') and func.__code__.co_flags & 0x80:  # CO_COROUTINE
-            return async_wrapper
-        else:
-            return sync_wrapper
+        return sync_wrapper
     
     return decorator
 
@@ -252,18 +356,27 @@ def trace_external_call(service: str, operation: str):
 
 def add_span_attribute(key: str, value: Any):
     """Add attribute to current span"""
+    if not _TRACING_ENABLED:
+        return
+    
     current_span = trace.get_current_span()
     if current_span:
         current_span.set_attribute(key, value)
 
 def add_span_event(name: str, attributes: Optional[Dict[str, Any]] = None):
     """Add event to current span"""
+    if not _TRACING_ENABLED:
+        return
+    
     current_span = trace.get_current_span()
     if current_span:
         current_span.add_event(name, attributes or {})
 
 def record_exception(exception: Exception):
     """Record exception in current span"""
+    if not _TRACING_ENABLED:
+        return
+    
     current_span = trace.get_current_span()
     if current_span:
         current_span.record_exception(exception)
@@ -276,6 +389,9 @@ def record_exception(exception: Exception):
 
 def get_trace_id() -> Optional[str]:
     """Get current trace ID"""
+    if not _TRACING_ENABLED:
+        return None
+    
     current_span = trace.get_current_span()
     if current_span and current_span.get_span_context().is_valid:
         return format(current_span.get_span_context().trace_id, '032x')
@@ -283,6 +399,9 @@ def get_trace_id() -> Optional[str]:
 
 def get_span_id() -> Optional[str]:
     """Get current span ID"""
+    if not _TRACING_ENABLED:
+        return None
+    
     current_span = trace.get_current_span()
     if current_span and current_span.get_span_context().is_valid:
         return format(current_span.get_span_context().span_id, '016x')
@@ -301,7 +420,7 @@ class TracingContext:
         self.kind = kind
         self.attributes = attributes or {}
         self.span = None
-        self.tracer = trace.get_tracer(__name__)
+        self.tracer = _TRACER
     
     def __enter__(self):
         self.span = self.tracer.start_span(self.name, kind=self.kind)
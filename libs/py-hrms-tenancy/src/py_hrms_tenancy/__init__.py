@@ -9,6 +9,7 @@ from .context import (
     get_current_tenant,
     get_tenant_data,
     set_tenant_context,
+    reset_tenant_context,
     clear_tenant_context,
     get_tenant_schema,
     require_tenant,
@@ -25,6 +26,7 @@ from .database import (
     initialize_tenant_database,
     get_tenant_db_manager,
     get_tenant_session,
+    set_session_schema,
     tenant_aware_model,
 )
 
@@ -38,6 +40,7 @@ __all__ = [
     "get_current_tenant",
     "get_tenant_data",
     "set_tenant_context",
+    "reset_tenant_context",
     "clear_tenant_context",
     "get_tenant_schema",
     "require_tenant",
@@ -53,6 +56,7 @@ __all__ = [
     "initialize_tenant_database",
     "get_tenant_db_manager",
     "get_tenant_session",
+    "set_session_schema",
     "tenant_aware_model",
 ]
 
@@ -8,11 +8,15 @@ This module provides tenant context management including:
 - Multi-tenant middleware
 """
 import os
-from typing import Optional, Dict, Any
-from contextvars import ContextVar
+import re
+from functools import lru_cache
+from typing import Optional, Dict, Any, FrozenSet, Tuple
+from contextvars import ContextVar, Token
 from dataclasses import dataclass
-from fastapi import Request, HTTPException, Depends
-from starlette.middleware.base import BaseHTTPMiddleware
+from fastapi import HTTPException, Depends
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 import structlog
 
 # Context variables for tenant tracking
@@ -21,6 +25,12 @@ tenant_data_var: ContextVar[Optional[Dict[str, Any]]] = ContextVar('tenant_data'
 
 logger = structlog.get_logger(__name__)
 
+# Subdomains that never identify a tenant
+_RESERVED_SUBDOMAINS = frozenset({"www", "api"})
+
+# Schema names end up in SQL statements, so only plain identifiers are allowed
+_SCHEMA_NAME_RE = re.compile(r"^[a-z_][a-z0-9_]*$")
+
 @dataclass
 class TenantInfo:
     """Tenant information"""
@@ -37,6 +47,8 @@ class TenantContext:
     
     def __init__(self):
         self._tenants: Dict[str, TenantInfo] = {}
+        self._active_ids: FrozenSet[str] = frozenset()
+        self._subdomain_tenants: Dict[str, str] = {}
         self._load_tenants()
     
     def _load_tenants(self):
@@ -66,6 +78,20 @@ class TenantContext:
         
         for tenant in default_tenants:
             self._tenants[tenant.id] = tenant
+        
+        self._update_active_ids()
+    
+    def _update_active_ids(self):
+        """Recompute the set of active tenant IDs after a change"""
+        self._active_ids = frozenset(
+            tenant_id for tenant_id, tenant in self._tenants.items()
+            if tenant.status == "active"
+        )
+        # Active tenants are addressable by a subdomain equal to their ID
+        self._subdomain_tenants = {
+            tenant_id: tenant_id for tenant_id in self._active_ids
+            if tenant_id not in _RESERVED_SUBDOMAINS
+        }
     
     def get_tenant(self, tenant_id: str) -> Optional[TenantInfo]:
         """Get tenant information by ID"""
@@ -75,19 +101,35 @@ class TenantContext:
         """Get all tenants"""
         return self._tenants.copy()
     
+    def get_tenant_for_subdomain(self, subdomain: str) -> Optional[str]:
+        """Get the active tenant ID served under a subdomain"""
+        return self._subdomain_tenants.get(subdomain)
+    
+    def get_active_tenant(self, tenant_id: str) -> Optional[TenantInfo]:
+        """Get tenant information if the tenant is valid and active"""
+        if tenant_id in self._active_ids:
+            return self._tenants[tenant_id]
+        return None
+    
     def add_tenant(self, tenant: TenantInfo):
         """Add a new tenant"""
+        if not _SCHEMA_NAME_RE.fullmatch(tenant.schema_name):
+            raise ValueError(f"Invalid schema name: {tenant.schema_name!r}")
+        
         self._tenants[tenant.id] = tenant
+        self._update_active_ids()
+        _schema_for.cache_clear()
     
     def remove_tenant(self, tenant_id: str):
         """Remove a tenant"""
         if tenant_id in self._tenants:
             del self._tenants[tenant_id]
+            self._update_active_ids()
+            _schema_for.cache_clear()
     
     def is_valid_tenant(self, tenant_id: str) -> bool:
         """Check if tenant ID is valid and active"""
-        tenant = self.get_tenant(tenant_id)
-        return tenant is not None and tenant.status == "active"
+        return tenant_id in self._active_ids
 
 # Global tenant context instance
 tenant_context = TenantContext()
@@ -100,17 +142,39 @@ def get_tenant_data() -> Optional[Dict[str, Any]]:
     """Get current tenant data from context"""
     return tenant_data_var.get()
 
-def set_tenant_context(tenant_id: str, tenant_data: Optional[Dict[str, Any]] = None):
-    """Set tenant context"""
-    current_tenant_var.set(tenant_id)
-    if tenant_data:
-        tenant_data_var.set(tenant_data)
+def set_tenant_context(
+    tenant_id: str,
+    tenant_data: Optional[Dict[str, Any]] = None
+) -> Tuple[Token, Optional[Token]]:
+    """Set tenant context
+    
+    Returns the context variable tokens for reset_tenant_context.
+    """
+    tenant_token = current_tenant_var.set(tenant_id)
+    data_token = tenant_data_var.set(tenant_data) if tenant_data else None
+    return tenant_token, data_token
+
+def reset_tenant_context(tokens: Tuple[Token, Optional[Token]]):
+    """Restore the tenant context from before set_tenant_context"""
+    tenant_token, data_token = tokens
+    current_tenant_var.reset(tenant_token)
+    if data_token is not None:
+        tenant_data_var.reset(data_token)
 
 def clear_tenant_context():
     """Clear tenant context"""
     current_tenant_var.set(None)
     tenant_data_var.set(None)
 
+@lru_cache(maxsize=256)
+def _schema_for(tenant_id: str) -> str:
+    # Cleared by TenantContext whenever tenants are added or removed
+    tenant = tenant_context.get_tenant(tenant_id)
+    if tenant:
+        return tenant.schema_name
+    
+    return "public"
+
 def get_tenant_schema(tenant_id: Optional[str] = None) -> str:
     """Get schema name for tenant"""
     if tenant_id is None:
@@ -119,43 +183,59 @@ def get_tenant_schema(tenant_id: Optional[str] = None) -> str:
     if tenant_id is None:
         return "public"  # Default schema
     
-    tenant = tenant_context.get_tenant(tenant_id)
-    if tenant:
-        return tenant.schema_name
-    
-    return "public"
+    return _schema_for(tenant_id)
 
-class TenantMiddleware(BaseHTTPMiddleware):
+@lru_cache(maxsize=256)
+def _tenant_response_headers(tenant_id: str, schema_name: str) -> Tuple[Tuple[bytes, bytes], ...]:
+    """Encoded X-Tenant-ID / X-Tenant-Schema response headers for a tenant"""
+    return (
+        (b"x-tenant-id", tenant_id.encode("latin-1")),
+        (b"x-tenant-schema", schema_name.encode("latin-1")),
+    )
+
+_TENANT_HEADER_NAMES = frozenset((b"x-tenant-id", b"x-tenant-schema"))
+
+class TenantMiddleware:
     """Middleware to extract and set tenant context"""
     
-    def __init__(self, app, default_tenant: str = "default"):
-        super().__init__(app)
+    def __init__(self, app: ASGIApp, default_tenant: str = "default"):
+        self.app = app
         self.default_tenant = default_tenant
     
-    async def dispatch(self, request: Request, call_next):
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
         # Extract tenant from various sources
-        tenant_id = self._extract_tenant_id(request)
+        headers = Headers(scope=scope)
+        tenant_id = self._extract_tenant_id(scope, headers)
         
         # Validate tenant
-        if not tenant_context.is_valid_tenant(tenant_id):
+        tenant_info = tenant_context.get_active_tenant(tenant_id)
+        if tenant_info is None:
             logger.warning(
                 "Invalid tenant ID",
                 tenant_id=tenant_id,
-                path=request.url.path,
-                method=request.method
+                path=scope["path"],
+                method=scope["method"]
             )
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid tenant: {tenant_id}"
+            # Middleware runs outside the app's exception handlers, so the
+            # error response is sent here rather than raised
+            response = JSONResponse(
+                {"detail": f"Invalid tenant: {tenant_id}"},
+                status_code=400
             )
+            await response(scope, receive, send)
+            return
         
         # Set tenant context
-        tenant_info = tenant_context.get_tenant(tenant_id)
-        set_tenant_context(
+        schema_name = tenant_info.schema_name
+        tokens = set_tenant_context(
             tenant_id,
             {
                 "name": tenant_info.name,
-                "schema": tenant_info.schema_name,
+                "schema": schema_name,
                 "settings": tenant_info.settings or {}
             }
         )
@@ -163,24 +243,32 @@ class TenantMiddleware(BaseHTTPMiddleware):
         logger.info(
             "Tenant context set",
             tenant_id=tenant_id,
-            schema=tenant_info.schema_name,
-            path=request.url.path
+            schema=schema_name,
+            path=scope["path"]
         )
         
-        try:
-            response = await call_next(request)
-            
-            # Add tenant info to response headers
-            response.headers["X-Tenant-ID"] = tenant_id
-            response.headers["X-Tenant-Schema"] = tenant_info.schema_name
-            
-            return response
+        tenant_headers = _tenant_response_headers(tenant_id, schema_name)
         
+        async def send_with_tenant_headers(message: Message):
+            if message["type"] == "http.response.start":
+                # Add tenant info to response headers, replacing any the
+                # endpoint set
+                message["headers"] = [
+                    *(
+                        header for header in message.get("headers", ())
+                        if header[0] not in _TENANT_HEADER_NAMES
+                    ),
+                    *tenant_headers,
+                ]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_tenant_headers)
         finally:
-            # Clear context after request
-            clear_tenant_context()
+            # Restore the context from before the request
+            reset_tenant_context(tokens)
     
-    def _extract_tenant_id(self, request: Request) -> str:
+    def _extract_tenant_id(self, scope: Scope, headers: Headers) -> str:
         """Extract tenant ID from request"""
         # Priority order:
         # 1. Header: X-Tenant-ID
@@ -190,26 +278,28 @@ class TenantMiddleware(BaseHTTPMiddleware):
         # 5. Default tenant
         
         # Check header
-        tenant_id = request.headers.get("x-tenant-id")
+        tenant_id = headers.get("x-tenant-id")
         if tenant_id:
             return tenant_id
         
         # Check query parameter
-        tenant_id = request.query_params.get("tenant_id")
-        if tenant_id:
-            return tenant_id
+        query_string = scope.get("query_string")
+        if query_string:
+            tenant_id = QueryParams(query_string).get("tenant_id")
+            if tenant_id:
+                return tenant_id
         
         # Check subdomain
-        host = request.headers.get("host", "")
-        if "." in host:
-            subdomain = host.split(".")[0]
-            if subdomain != "www" and subdomain != "api":
-                # Check if subdomain maps to a tenant
-                if tenant_context.is_valid_tenant(subdomain):
-                    return subdomain
+        host = headers.get("host", "")
+        dot = host.find(".")
+        if dot > 0:
+            # Check if subdomain maps to a tenant
+            tenant_id = tenant_context.get_tenant_for_subdomain(host[:dot])
+            if tenant_id:
+                return tenant_id
         
         # Check JWT token (simplified - in production you'd decode the token)
-        auth_header = request.headers.get("authorization")
+        auth_header = headers.get("authorization")
         if auth_header and auth_header.startswith("Bearer "):
             # In production, decode JWT and extract tenant_id claim
             pass
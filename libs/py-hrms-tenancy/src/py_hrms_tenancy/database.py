@@ -8,11 +8,14 @@ This module provides database isolation strategies including:
 - Migration management per tenant
 """
 import os
+import weakref
+from functools import lru_cache
 from typing import Dict, Any, Optional, AsyncGenerator
 from contextlib import asynccontextmanager
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.sql import text
-from sqlalchemy import MetaData, Table
+from sqlalchemy.sql import text, TextClause
+from sqlalchemy import MetaData, Table, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import DeclarativeBase
 import structlog
 
@@ -20,6 +23,70 @@ from .context import get_current_tenant, get_tenant_schema, tenant_context
 
 logger = structlog.get_logger(__name__)
 
+@lru_cache(maxsize=256)
+def _search_path_stmt(schema: str) -> TextClause:
+    """Prebuilt SET search_path statement for a tenant schema"""
+    # Schema names are validated when tenants are registered
+    return text(f"SET search_path TO {schema}, public")
+
+_RESET_SEARCH_PATH = text("RESET search_path")
+
+# Engines whose connections carry search_path tracking
+_tracked_engines: "weakref.WeakSet[Engine]" = weakref.WeakSet()
+
+def _track_search_path(engine):
+    """Track the committed search_path of each pooled connection
+    
+    SET only survives if its transaction commits, so the schema set in a
+    session stays pending until then and is dropped on rollback. This is only
+    accurate if every schema switch goes through set_session_schema.
+    """
+    @event.listens_for(engine.sync_engine, "commit")
+    def on_commit(conn):
+        info = conn.connection.info
+        if "pending_search_path" in info:
+            info["search_path"] = info.pop("pending_search_path")
+    
+    @event.listens_for(engine.sync_engine, "rollback")
+    def on_rollback(conn):
+        conn.connection.info.pop("pending_search_path", None)
+    
+    @event.listens_for(engine.sync_engine, "rollback_savepoint")
+    def on_rollback_savepoint(conn, name, context):
+        # The path reverts to whatever it was when the savepoint started,
+        # which is not tracked; None forces the next switch to SET again
+        conn.connection.info["pending_search_path"] = None
+    
+    @event.listens_for(engine.sync_engine.pool, "reset")
+    def on_reset(dbapi_connection, connection_record, reset_state):
+        connection_record.info.pop("pending_search_path", None)
+    
+    _tracked_engines.add(engine.sync_engine)
+
+async def set_session_schema(session: AsyncSession, schema: str):
+    """Point the session's connection at a tenant schema
+    
+    On engines set up by TenantDatabaseManager the SET is skipped when the
+    connection is already on the schema; elsewhere it is always issued.
+    """
+    connection = await session.connection()
+    if connection.sync_engine not in _tracked_engines:
+        if schema and schema != "public":
+            await session.execute(_search_path_stmt(schema))
+        return
+    
+    connection_info = connection.sync_connection.connection.info
+    current_schema = connection_info.get(
+        "pending_search_path",
+        connection_info.get("search_path", "public")
+    )
+    if schema != current_schema:
+        if schema == "public":
+            await session.execute(_RESET_SEARCH_PATH)
+        else:
+            await session.execute(_search_path_stmt(schema))
+        connection_info["pending_search_path"] = schema
+
 class TenantAwareBase(DeclarativeBase):
     """Base class for tenant-aware models"""
     
@@ -51,6 +118,7 @@ class TenantDatabaseManager:
             pool_size=int(os.getenv("DB_POOL_SIZE", "10")),
             max_overflow=int(os.getenv("DB_MAX_OVERFLOW", "20")),
         )
+        _track_search_path(self.engines["default"])
         
         self.session_makers["default"] = async_sessionmaker(
             self.engines["default"],
@@ -87,8 +155,7 @@ class TenantDatabaseManager:
         async with session_maker() as session:
             # Set search path for schema isolation
             schema = get_tenant_schema(tenant_id)
-            if schema and schema != "public":
-                await session.execute(text(f"SET search_path TO {schema}, public"))
+            await set_session_schema(session, schema)
             
             logger.debug(
                 "Database session created",
@@ -191,7 +258,7 @@ class TenantDatabaseManager:
             # This is a simplified migration - in production you'd use Alembic
             async with self.get_session(tenant_id) as session:
                 # Set search path
-                await session.execute(text(f"SET search_path TO {schema_name}, public"))
+                await set_session_schema(session, schema_name)
                 
                 # Create tables (this would be done via Alembic in production)
                 from sqlalchemy import MetaData
@@ -280,9 +347,7 @@ class TenantQueryMixin:
         
         # Ensure we're in the right schema context
         if tenant_id:
-            schema = get_tenant_schema(tenant_id)
-            if schema and schema != "public":
-                await session.execute(text(f"SET search_path TO {schema}, public"))
+            await set_session_schema(session, get_tenant_schema(tenant_id))
         
         result = await session.execute(select(cls).where(cls.id == id))
         return result.scalar_one_or_none()
@@ -300,9 +365,7 @@ class TenantQueryMixin:
         
         # Ensure we're in the right schema context
         if tenant_id:
-            schema = get_tenant_schema(tenant_id)
-            if schema and schema != "public":
-                await session.execute(text(f"SET search_path TO {schema}, public"))
+            await set_session_schema(session, get_tenant_schema(tenant_id))
         
         result = await session.execute(
             select(cls).limit(limit).offset(offset)
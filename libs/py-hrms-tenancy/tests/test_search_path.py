@@ -0,0 +1,116 @@
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from py_hrms_tenancy import database
+from py_hrms_tenancy.context import TenantContext, TenantInfo
+
+
+@pytest.fixture
+def manager(monkeypatch, tmp_path):
+    # SQLite has no search_path; stand-in statements show what would be sent
+    monkeypatch.setattr(database, "_search_path_stmt", lambda schema: text(f"SELECT 'set {schema}'"))
+    monkeypatch.setattr(database, "_RESET_SEARCH_PATH", text("SELECT 'reset'"))
+    # A single pooled connection, so every session reuses the same one
+    monkeypatch.setenv("DB_POOL_SIZE", "1")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    return database.TenantDatabaseManager(f"sqlite+aiosqlite:///{tmp_path / 'tenancy.db'}")
+
+
+def _record_switches(engine):
+    statements = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def record(conn, cursor, statement, *args):
+        if statement.startswith("SELECT '"):
+            statements.append(statement)
+
+    return statements
+
+
+@pytest.mark.asyncio
+async def test_set_skipped_after_committed_switch(manager):
+    statements = _record_switches(manager.engines["default"])
+
+    async with manager.get_session("acme-corp") as session:
+        await session.commit()
+    async with manager.get_session("acme-corp") as session:
+        await session.execute(text("SELECT 1"))
+
+    assert statements == ["SELECT 'set tenant_acme_corp'"]
+
+
+@pytest.mark.asyncio
+async def test_set_reissued_after_rollback(manager):
+    statements = _record_switches(manager.engines["default"])
+
+    async with manager.get_session("acme-corp") as session:
+        await session.rollback()
+    async with manager.get_session("acme-corp") as session:
+        await session.execute(text("SELECT 1"))
+
+    assert statements == ["SELECT 'set tenant_acme_corp'"] * 2
+
+
+@pytest.mark.asyncio
+async def test_set_reissued_after_savepoint_rollback(manager):
+    statements = _record_switches(manager.engines["default"])
+
+    async with manager.get_session("acme-corp") as session:
+        await session.commit()
+    async with manager.get_session("acme-corp") as session:
+        savepoint = await session.begin_nested()
+        await database.set_session_schema(session, "tenant_tech_startup")
+        await savepoint.rollback()
+        await session.commit()
+    async with manager.get_session("tech-startup") as session:
+        await session.execute(text("SELECT 1"))
+
+    assert statements == [
+        "SELECT 'set tenant_acme_corp'",
+        "SELECT 'set tenant_tech_startup'",
+        "SELECT 'set tenant_tech_startup'",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_reset_when_switching_back_to_public(manager):
+    statements = _record_switches(manager.engines["default"])
+
+    async with manager.get_session("acme-corp") as session:
+        await session.commit()
+    async with manager.get_session("default") as session:
+        await session.commit()
+    async with manager.get_session("default") as session:
+        await session.execute(text("SELECT 1"))
+
+    assert statements == ["SELECT 'set tenant_acme_corp'", "SELECT 'reset'"]
+
+
+@pytest.mark.asyncio
+async def test_untracked_engine_always_sets(manager, tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'untracked.db'}")
+    statements = _record_switches(engine)
+
+    try:
+        for _ in range(2):
+            async with AsyncSession(engine) as session:
+                await database.set_session_schema(session, "tenant_acme_corp")
+                await session.commit()
+    finally:
+        await engine.dispose()
+
+    assert statements == ["SELECT 'set tenant_acme_corp'"] * 2
+
+
+@pytest.mark.parametrize(
+    "schema_name",
+    ["Tenant_Upper", "1tenant", "tenant-dash", "tenant; DROP SCHEMA public", ""],
+)
+def test_add_tenant_rejects_invalid_schema_name(schema_name):
+    context = TenantContext()
+
+    with pytest.raises(ValueError):
+        context.add_tenant(TenantInfo(id="bad", name="Bad", schema_name=schema_name))
+
+    assert context.get_tenant("bad") is None
@@ -0,0 +1,47 @@
+import pytest
+
+from py_hrms_tenancy.context import TenantMiddleware
+
+
+async def _app_with_own_tenant_headers(scope, receive, send):
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"x-tenant-id", b"stale"),
+            (b"x-tenant-schema", b"public"),
+        ],
+    })
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def _response_headers(app, tenant_id):
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/employees",
+        "query_string": b"",
+        "headers": [(b"x-tenant-id", tenant_id.encode("latin-1"))],
+    }
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    return messages[0]["headers"]
+
+
+@pytest.mark.asyncio
+async def test_tenant_headers_replace_endpoint_values():
+    app = TenantMiddleware(_app_with_own_tenant_headers)
+
+    headers = await _response_headers(app, "acme-corp")
+
+    assert [value for name, value in headers if name == b"x-tenant-id"] == [b"acme-corp"]
+    assert [value for name, value in headers if name == b"x-tenant-schema"] == [b"tenant_acme_corp"]
+    assert (b"content-type", b"application/json") in headers
@@ -1,18 +1,18 @@
 #!/usr/bin/env python3
 import json, sys
-from pathlib import Path
 
 # very small "merge": copies paths/components; assumes non-conflicting ids
 out = {"openapi":"3.0.3","info":{"title":"AgenticHR","version":"0.1.0"},
        "paths":{}, "components":{"schemas":{}}}
+out_paths = out["paths"]
+out_schemas = out["components"]["schemas"]
 
 for p in sys.argv[1:]:
     try:
-        doc = json.loads(Path(p).read_text())
-        for k,v in doc.get("paths",{}).items():
-            out["paths"][k] = v
-        comps = doc.get("components",{}).get("schemas",{})
-        out["components"]["schemas"].update(comps)
+        with open(p, "rb") as f:
+            doc = json.load(f)
+        out_paths.update(doc.get("paths") or {})
+        out_schemas.update((doc.get("components") or {}).get("schemas") or {})
     except (FileNotFoundError, json.JSONDecodeError) as e:
         print(f"Warning: Could not process {p}: {e}", file=sys.stderr)
         continue
@@ -13,25 +13,47 @@ def openapi_to_postman(openapi_file, output_file):
         openapi_spec = json.load(f)
     
     # Basic Postman collection structure
-    collection = {
-        "info": {
-            "name": openapi_spec.get("info", {}).get("title", "API Collection"),
-            "description": openapi_spec.get("info", {}).get("description", ""),
-            "schema": "https://schema.getpostman.com/json/collection/v2.1.0/collection.json"
-        },
-        "item": [],
-        "variable": [
-            {
-                "key": "baseUrl",
-                "value": "http://localhost:8000",
-                "type": "string"
-            }
-        ]
+    info = {
+        "name": openapi_spec.get("info", {}).get("title", "API Collection"),
+        "description": openapi_spec.get("info", {}).get("description", ""),
+        "schema": "https://schema.getpostman.com/json/collection/v2.1.0/collection.json"
     }
-    
+    variables = [
+        {
+            "key": "baseUrl",
+            "value": "http://localhost:8000",
+            "type": "string"
+        }
+    ]
+    
+    # Write Postman collection one request at a time, so the item list is
+    # never held in memory; the output matches json.dump(..., indent=2)
+    count = 0
+    with open(output_file, 'w') as f:
+        f.write('{\n  "info": ' + _dump_nested(info, 1) + ',\n  "item": [')
+        
+        for request_item in postman_items(openapi_spec):
+            f.write(',\n    ' if count else '\n    ')
+            f.write(_dump_nested(request_item, 2))
+            count += 1
+        
+        f.write('\n  ]' if count else ']')
+        f.write(',\n  "variable": ' + _dump_nested(variables, 1) + '\n}')
+    
+    print(f"✅ Generated Postman collection with {count} requests")
+
+def _dump_nested(value, depth):
+    """Serialize value as if nested depth levels deep in an indent=2 document"""
+    return json.dumps(value, indent=2).replace("\n", "\n" + "  " * depth)
+
+def postman_items(openapi_spec):
+    """Yield a Postman request item for each operation in the spec"""
     # Convert paths to Postman requests
     paths = openapi_spec.get("paths", {})
     
+    # Request bodies are only serialized, so examples can be shared
+    examples = {}
+    
     for path, methods in paths.items():
         for method, operation in methods.items():
             if method.upper() in ["GET", "POST", "PUT", "DELETE", "PATCH"]:
@@ -67,7 +89,7 @@ def openapi_to_postman(openapi_file, output_file):
                         schema = json_content.get("schema", {})
                         
                         # Create example body
-                        example_body = create_example_from_schema(schema)
+                        example_body = create_example_from_schema(schema, examples)
                         
                         request_item["request"]["body"] = {
                             "mode": "raw",
@@ -79,39 +101,55 @@ def openapi_to_postman(openapi_file, output_file):
                             }
                         }
                 
-                collection["item"].append(request_item)
-    
-    # Write Postman collection
-    with open(output_file, 'w') as f:
-        json.dump(collection, f, indent=2)
-    
-    print(f"✅ Generated Postman collection with {len(collection['item'])} requests")
+                yield request_item
+
+# Example values for string formats
+_STRING_FORMAT_EXAMPLES = {
+    "email": "user@example.com",
+    "date-time": "2024-01-01T00:00:00Z",
+}
 
-def create_example_from_schema(schema):
-    """Create example data from JSON schema"""
+def create_example_from_schema(schema, cache=None):
+    """Create example data from JSON schema
+    
+    With a cache dict, examples are memoized per schema object, so schemas
+    shared across operations are only walked once. Cached examples are
+    shared between results and must not be mutated.
+    """
     if not schema:
         return {}
     
+    if cache is not None:
+        cached = cache.get(id(schema))
+        if cached is not None:
+            return cached[1]
+    
+    example = _example_for(schema, cache)
+    
+    if cache is not None:
+        # Keep the schema referenced so its id is not reused
+        cache[id(schema)] = (schema, example)
+    
+    return example
+
+def _example_for(schema, cache):
     schema_type = schema.get("type", "object")
     
     if schema_type == "object":
-        example = {}
-        properties = schema.get("properties", {})
-        for prop_name, prop_schema in properties.items():
-            example[prop_name] = create_example_from_schema(prop_schema)
-        return example
+        return {
+            prop_name: create_example_from_schema(prop_schema, cache)
+            for prop_name, prop_schema in schema.get("properties", {}).items()
+        }
     
     elif schema_type == "array":
         items_schema = schema.get("items", {})
-        return [create_example_from_schema(items_schema)]
+        return [create_example_from_schema(items_schema, cache)]
     
     elif schema_type == "string":
-        if schema.get("format") == "email":
-            return "user@example.com"
-        elif schema.get("format") == "date-time":
-            return "2024-01-01T00:00:00Z"
-        else:
-            return schema.get("example", "string")
+        format_example = _STRING_FORMAT_EXAMPLES.get(schema.get("format"))
+        if format_example is not None:
+            return format_example
+        return schema.get("example", "string")
     
     elif schema_type == "integer":
         return schema.get("example", 1)
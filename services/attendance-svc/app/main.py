@@ -28,7 +28,7 @@ from py_hrms_auth import (
 from py_hrms_auth.jwt_dep import JWKS_URL, OIDC_AUDIENCE, ISSUER
 from py_hrms_auth.middleware import SecurityHeadersMiddleware
 from py_hrms_observability import (
-    init_audit_db, AuditLogMiddleware,
+    init_audit_db, close_audit_writer, AuditLogMiddleware,
     configure_logging, LoggingMiddleware,
     configure_tracing, MetricsMiddleware,
     get_metrics, get_metrics_content_type
@@ -73,6 +73,7 @@ async def lifespan(app: FastAPI):
     await init_audit_db()
     yield
     logger.info("Shutting down attendance-svc")
+    await close_audit_writer()
 
 app = FastAPI(
     title="attendance-svc",
@@ -57,6 +57,7 @@ async def lifespan(app: FastAPI):
     await init_audit_db()
     yield
     logger.info("Shutting down auth-svc")
+    await close_audit_writer()
 
 app = FastAPI(
     title="auth-svc",
@@ -123,7 +124,7 @@ def cleanup_expired_sessions():
 
 from py_hrms_auth.middleware import SecurityHeadersMiddleware
 from py_hrms_observability import (
-    init_audit_db, AuditLogMiddleware,
+    init_audit_db, close_audit_writer, AuditLogMiddleware,
     configure_logging, LoggingMiddleware,
     configure_tracing, MetricsMiddleware,
     get_metrics, get_metrics_content_type
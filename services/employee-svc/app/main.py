@@ -61,6 +61,7 @@ async def lifespan(app: FastAPI):
     await init_audit_db()
     yield
     logger.info("Shutting down employee-svc")
+    await close_audit_writer()
 
 app = FastAPI(
     title="employee-svc",
@@ -218,7 +219,7 @@ def reindex_employee(employee_id: int):
 
 from py_hrms_auth.middleware import SecurityHeadersMiddleware
 from py_hrms_observability import (
-    init_audit_db, AuditLogMiddleware,
+    init_audit_db, close_audit_writer, AuditLogMiddleware,
     configure_logging, LoggingMiddleware,
     configure_tracing, MetricsMiddleware,
     get_metrics, get_metrics_content_type